@@ -0,0 +1,82 @@
+import os
+import threading
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """
+    Exclusive lock held on a lock file, shared by every process (uvicorn workers) and thread
+    that opens the same path
+
+        with FileLock("./graph/snapshots/index.lock"):
+            ...
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def __enter__(self) -> "FileLock":
+        file = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after 10 seconds, keep waiting
+                        continue
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            file.close()
+            raise
+
+        self._local.file = file
+        return self
+
+    def __exit__(self, *exc) -> None:
+        file = self._local.file
+        self._local.file = None
+        try:
+            if os.name == "nt":
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        finally:
+            file.close()
+
+
+def fsync_directory(path: str) -> None:
+    # Makes a rename durable. Not possible (nor needed) on Windows
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomically(path: str, content: bytes) -> None:
+    # Readers (in any process) see either the previous content or the new one, never half a file,
+    # and the new content survives a crash once this returns
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
@@ -1,62 +1,53 @@
 import os
 import json
-from datetime import datetime
-from collections import Counter, defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pprint import pprint
-from typing import List, Dict, Any, Tuple
+import asyncio
+import functools
+import logging
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pprint import pformat
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable
 import re
+import sqlite3
 
 from netmiko import (
-    ConnectHandler,
     NetMikoAuthenticationException,
     NetMikoTimeoutException,
 )
-from netmiko.utilities import get_structured_data
 
+from graph.device_health import get_device_health
+from graph.history_db import get_history_db
+from graph.logger import get_logger
+from graph.metrics import get_metrics, timed
+from graph.parse_pool import close_parse_pool, get_parse_pool, get_parse_workers
+from graph.raw_archive import RawArchive, get_raw_archive
+from graph.reachability import MAX_CONCURRENT_CHECKS, get_precheck_timeout, is_reachable
+from graph.session_pool import SessionPool, get_session_pool
+from graph.snapshot_store import get_snapshot_store
+from graph.stp_parser import get_bridge_id, get_bridge_ids_per_vlan, parse_stp_output
+from graph.templates import get_template_registry
+from graph.topology_index import TopologyIndex
+from graph.version_cache import get_version_cache
 
-def read_counter(COUNTER_FILE) -> int:
-    if not os.path.exists(COUNTER_FILE):
-        return 1
-    with open(COUNTER_FILE, 'r') as file:
-        return int(file.read().strip())
+CISCO_STP_RAW_OUTPUT_ROOT_BRIDGE_TEXT = "This bridge is the root"
 
-def write_counter(counter, COUNTER_FILE) -> None:
-    with open(COUNTER_FILE, 'w') as file:
-        file.write(str(counter))
+logger = get_logger("code")
 
-def save_data(data) -> None:
-    # Read and update the counter
-    COUNTER_FILE = './graph/counter.txt'
-    counter = read_counter(COUNTER_FILE)
-    new_counter = counter + 1
-    write_counter(new_counter, COUNTER_FILE)
-    
-    # Get the current date and time
-    now = datetime.now()
-
-    # Format the date and time as a string
-    formatted_now = now.strftime("%Y-%m-%d_%H-%M-%S")
-
-    # Create the directory path with the counter
-    dir_path = f'./graph/saved_data/{counter:01d}-{formatted_now}/'
 
-    # Ensure the directory exists
-    os.makedirs(dir_path, exist_ok=True)
-
-    # Define the paths and corresponding data
-    paths_and_data = {
-        'nodes.json': data.get("nodes"),
-        'edges.json': data.get("edges"),
-        'edges_with_blocked_links.json': data.get("edges_with_blocked_links"),
-        'blocked_interfaces.json': data.get("blocked_interfaces")
-    }
-
-    # Save data to the files
-    for file_name, content in paths_and_data.items():
-        file_path = os.path.join(dir_path, file_name)
-        with open(file_path, 'w') as outfile:
-            json.dump(content, outfile)
+def save_data(data) -> None:
+    # Store the topology under the next value of the counter. Parts already stored by a previous
+    # snapshot are not written again, only a new record is added to the index (see graph/snapshot_store.py)
+    record = get_snapshot_store().save(data)
+    logger.info("Snapshot %s saved (%s)", record.get('id'), record.get('hash')[:12])
+
+    # Make it queryable by time and device. Rows of a topology are only written the first time it is seen.
+    # Runs in a worker thread with save_data (see main). The snapshot is already stored, so a history
+    # database kept busy by another writer only costs this snapshot its history rows
+    try:
+        get_history_db().record(record, data)
+    except sqlite3.Error as e:
+        logger.warning("Snapshot %s not recorded in the history database: %s", record.get('id'), e)
 
 def set_options_to_blocked_edges(edges_finally_deleted, edges_without_duplicated_with_blocked_links):
     # Properties to add
@@ -110,17 +101,15 @@ def select_specific_data(results) -> List[Dict[str, Any]]:
 
     return filtered_results
 
-def print_updated_edge_information(edges_without_duplicated) -> None:
-    #print(edges_without_duplicated)
-    print("\nBetter way to show edges_without_duplicated:")
-    for edge in edges_without_duplicated:
-        print(edge)
+def format_items(items) -> str:
+    # One item per line, for the debug dumps
+    return "\n".join(str(item) for item in items)
+
+def log_updated_edge_information(edges_without_duplicated) -> None:
+    logger.debug("edges_without_duplicated:\n%s", format_items(edges_without_duplicated))
 
-def print_edges_with_options(edges_with_options) -> None:
-    #print(edges_with_options)
-    print("\nBetter way to show edges_with_options:")
-    for edge in edges_with_options:
-        print(edge)
+def log_edges_with_options(edges_with_options) -> None:
+    logger.debug("edges_with_options:\n%s", format_items(edges_with_options))
 
 def find_blocked_interfaces(results) -> List[Dict[str, Dict[str, List[str]]]]:
     # Here, we are implementing a list of blocked interfaces (blocked by STP protocol) for each device
@@ -143,58 +132,38 @@ def find_blocked_interfaces(results) -> List[Dict[str, Dict[str, List[str]]]]:
     return [{k: v} for k, v in blocked_interfaces.items()]
 
 def remove_blocked_links(edges_to_be_deleted: List[Dict[str, int]], edges_without_duplicated: List[Dict[str, int]]) -> List[Dict[str, int]]:
-    m = len(edges_to_be_deleted)
-    if m == 1:
-        print("We found that 1 edge must be deleted and it is the following one:")
-    else:
-        print(f"We found that {m} edges must be deleted and those are:")
-    
-    print("edges_to_be_deleted: ", edges_to_be_deleted)
+    logger.debug("%d edge(s) must be deleted: %s", len(edges_to_be_deleted), edges_to_be_deleted)
+    logger.debug("Before eliminating edge(s), edges_without_duplicated: %d element(s)\n%s", len(edges_without_duplicated), edges_without_duplicated)
 
-    print("\nBefore eliminating edge(s)")
-    print(f"edges_without_duplicated: {len(edges_without_duplicated)} element(s)")
-    print(edges_without_duplicated)
-
-    def normalize_edge(edge: Dict[str, int]) -> Dict[str, int]:
-        return {'from': edge['from'], 'to': edge['to']}
+    # Index the remaining edges by (from, to) so each lookup and removal is O(1)
+    remaining_edges = {(e['from'], e['to']): e for e in edges_without_duplicated}
 
     counter_number_of_removed_edges = 0
     edges_finally_deleted = []
     for edge in edges_to_be_deleted:
-        # Create the opposite edge dictionary
-        opposite_edge = normalize_edge({'from': edge.get("to"), 'to': edge.get("from")})
-
-        # Normalize and try to remove the original edge if it exists
-        normalized_edges = [normalize_edge(e) for e in edges_without_duplicated]
-        if normalize_edge(edge) in normalized_edges:
-            to_delete = next(e for e in edges_without_duplicated if normalize_edge(e) == normalize_edge(edge))
-            edges_without_duplicated.remove(to_delete)
-            edges_finally_deleted.append(to_delete)
-            counter_number_of_removed_edges = counter_number_of_removed_edges + 1
-
-        # Normalize and try to remove the opposite edge if it exists
-        if opposite_edge in normalized_edges:
-            to_delete = next(e for e in edges_without_duplicated if normalize_edge(e) == opposite_edge)
-            edges_without_duplicated.remove(to_delete)
-            edges_finally_deleted.append(to_delete)
-            counter_number_of_removed_edges = counter_number_of_removed_edges + 1
-
-    print("\nAfter eliminating edge(s)")
-    print(f"edges_without_duplicated: {len(edges_without_duplicated)} element(s)")
-    print(edges_without_duplicated)
-    print(f"Amount of removed edges: {counter_number_of_removed_edges}")
-    print(f"\nedges_finally_deleted: {edges_finally_deleted}")
+        # Try to remove the original edge and then the opposite one, if they exist
+        for key in ((edge.get("from"), edge.get("to")), (edge.get("to"), edge.get("from"))):
+            to_delete = remaining_edges.pop(key, None)
+            if to_delete is not None:
+                edges_finally_deleted.append(to_delete)
+                counter_number_of_removed_edges = counter_number_of_removed_edges + 1
+
+    # Keep the original order of the edges that were not removed
+    edges_without_duplicated[:] = [e for e in edges_without_duplicated if remaining_edges.get((e['from'], e['to'])) is e]
+
+    logger.debug("After eliminating edge(s), edges_without_duplicated: %d element(s)\n%s", len(edges_without_duplicated), edges_without_duplicated)
+    logger.debug("Amount of removed edges: %d, edges_finally_deleted: %s", counter_number_of_removed_edges, edges_finally_deleted)
     return edges_without_duplicated, edges_finally_deleted
 
 
-def identify_blocked_links(results: List[Dict[str, Any]]) -> List[Dict[str, int]]:
+def identify_blocked_links(results: List[Dict[str, Any]], index: TopologyIndex = None) -> List[Dict[str, int]]:
+    index = index or TopologyIndex(results)
     edges_to_be_deleted = []
 
     for result in results:
-        #device_prompt = result.get("prompt")
+        device_prompt = result.get("prompt")
         device_id = result.get("id")
         stp_output = result.get("stp_output_parsed", [])
-        cdp_output = result.get("cdp_output_parsed", [])
 
         # Step 1: Identify interfaces with Role=Alternate
         altn_interfaces = [entry for entry in stp_output if entry.get("role") == "Alternate"]
@@ -204,56 +173,30 @@ def identify_blocked_links(results: List[Dict[str, Any]]) -> List[Dict[str, int]
             interface_name = altn_interface.get("interface")
             #print("\ninterface_name", interface_name)
 
-            # Step 2: Find matching CDP entry
-            matching_cdp_entry = next((entry for entry in cdp_output if entry.get("local_interface") == interface_name), None)
-            #print("\nmatching_cdp_entry", matching_cdp_entry)
-
-            if matching_cdp_entry:
-                neighbor_name = matching_cdp_entry.get("neighbor")
-                #print("\nneighbor_name", neighbor_name)
-
-                # Step 3: Find neighbor device ID
-                neighbor_device = next((dev for dev in results if dev.get("prompt") == neighbor_name), None)
-                #print("\nneighbor_device", neighbor_device)
+            # Step 2 and 3: Find the neighbor device connected to that interface (CDP entry) and its ID
+            neighbor_device = index.find_neighbor(device_prompt, interface_name)
+            #print("\nneighbor_device", neighbor_device)
 
-                if neighbor_device:
-                    neighbor_id = neighbor_device.get("id")
+            if neighbor_device:
+                neighbor_id = neighbor_device.get("id")
 
-                    # Step 4: Create edge dictionary
-                    edge = {
-                        "from": device_id,
-                        "to": neighbor_id
-                    }
-                    edges_to_be_deleted.append(edge)
+                # Step 4: Create edge dictionary
+                edge = {
+                    "from": device_id,
+                    "to": neighbor_id
+                }
+                edges_to_be_deleted.append(edge)
     return edges_to_be_deleted
 
-def print_edge_information(edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names) -> None:
-    #print(switches)
-    print(f"\nBetter way to show switches:\nSwitch references")
-    for switch in switches:
-        print(switch)
+def log_edge_information(edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names) -> None:
+    logger.debug("Switch references:\n%s", format_items(switches))
+    logger.debug("edges:\n%s", format_items(edges))
+    logger.debug("edges_with_names:\n%s", format_items(edges_with_names))
+    logger.debug("edges_without_duplicated:\n%s", format_items(edges_without_duplicated))
+    logger.debug("edges_without_duplicated_with_names:\n%s", format_items(edges_without_duplicated_with_names))
 
-    #print(edges)
-    print("\nBetter way to show edges:")
-    for edge in edges:
-        print(edge)
-        
-    #print(edges_with_names)
-    print("\nBetter way to show edges_with_names:")
-    for edges_with_name in edges_with_names:
-        print(edges_with_name)
-
-    #print(edges_without_duplicated)
-    print("\nBetter way to show edges_without_duplicated:")
-    for edge_wo in edges_without_duplicated:
-        print(edge_wo)
-
-    #print(edges_without_duplicated_with_names)
-    print("\nBetter way to show edges_without_duplicated_with_names:")
-    for edge_wo_with_name in edges_without_duplicated_with_names:
-        print(edge_wo_with_name)
-
-def process_edges(results) -> List[Dict[str, Any]]:
+def process_edges(results, index: TopologyIndex = None) -> List[Dict[str, Any]]:
+    index = index or TopologyIndex(results)
     edges: List[Dict[str, int]] = []
     edges_with_names: List[Dict[str, str]] = []
     switches: List[Dict[str, Any]] = []
@@ -281,13 +224,9 @@ def process_edges(results) -> List[Dict[str, Any]]:
             edge_with_name = {'from': switch_name, 'to': neighbor_prompt}
             edges_with_names.append(edge_with_name)
 
-            neighbor_id = None
             # Find neighbor id based on neighbor prompt
-            for neighbor_switch in results:
-                if neighbor_switch.get("prompt") == neighbor_prompt:
-                    neighbor_id = neighbor_switch.get("id")
-                    break
-            
+            neighbor_id = index.get_id(neighbor_prompt)
+
             if neighbor_id is not None:
                 # # Find role and status interface for local switch
                 # for entry in results:
@@ -325,11 +264,8 @@ def process_edges(results) -> List[Dict[str, Any]]:
 
     return edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names, edges_without_duplicated_with_blocked_links
 
-def print_node_information(nodes) -> None:
-    #print(nodes)
-    print("\nBetter way to show nodes:")
-    for node in nodes:
-        print(node)
+def log_node_information(nodes) -> None:
+    logger.debug("nodes:\n%s", format_items(nodes))
 
 def update_node_title_with_level_info(nodes) -> List[Dict[str, Any]]:
     for node in nodes:
@@ -341,131 +277,188 @@ def update_node_title_with_level_info(nodes) -> List[Dict[str, Any]]:
         node["title"] = title + f"\nLevel: {level}\nPriority: {priority}\nMAC Address: {mac_address}"
     return nodes
 
-def print_node_structure(nodes) -> None:
+def log_node_structure(nodes) -> None:
     # Sort nodes by key 'level'
     sorted_nodes = sorted(nodes, key = lambda x: x.get("level"))
 
-    # Print the network tree structure
-    print("\nOption 1: Network Tree Structure")
-    print(32 * '-')
-    # Option 1
-    for sorted_node in sorted_nodes:
-        indent = 2 * '-' * sorted_node.get("level")
-        print(f"{indent}{sorted_node.get("label")} - {sorted_node.get("title")}, Level: {sorted_node.get("level")}")
-
-    print("\nOption 2: Network Tree Structure")
-    print(32 * '-')
-    # Option 2
+    # Network tree structure, one node per line indented by its level
+    lines = []
     for sorted_node in sorted_nodes:
         indent = 2 * ' ' * sorted_node.get("level")
-        print(f"({sorted_node.get("level")}) | {indent}{sorted_node.get("label")} - {sorted_node.get("title")}")
+        lines.append(f"({sorted_node.get("level")}) | {indent}{sorted_node.get("label")} - {sorted_node.get("title")}")
+    logger.debug("Network tree structure:\n%s", "\n".join(lines))
 
 
-def process_nodes(root_bridge_data, results) -> List[Dict[str, Any]]:
-    # Level 0: Node for Root Bridge
-    def calculate_node_for_level_0(root_bridge_data) -> List[Dict[str, Any]]:
-        nodes = []
-        node = {
-            "id": root_bridge_data.get("id"),
-            "label": root_bridge_data.get("label"),
-            "level": root_bridge_data.get("level"),
-            "title": root_bridge_data.get("title"),
-            "priority": root_bridge_data.get("priority"),
-            "mac_address": root_bridge_data.get("mac_address")
+def process_nodes(root_bridge_data, results, index: TopologyIndex = None) -> List[Dict[str, Any]]:
+    index = index or TopologyIndex(results)
+
+    def build_node(result, level) -> Dict[str, Any]:
+        return {
+            "id": result.get("id"),
+            "label": result.get("label"),
+            "level": level,
+            "title": result.get("title"),
+            "priority": result.get("priority"),
+            "mac_address": result.get("mac_address")
         }
-        nodes.append(node)
-        return nodes
-    
-    nodes = calculate_node_for_level_0(root_bridge_data)
+
+    # Level 0: Node for Root Bridge
+    nodes = [build_node(root_bridge_data, root_bridge_data.get("level"))]
     #print("\nLevel 0 - nodes:\n", nodes)
 
-    # Once the root bridge node has been added, let's proceed with root bridge neighbors
-    # Level 1: Nodes for Root Bridge neighbors
-    def calculate_nodes_for_level_1(nodes, root_bridge_data, results) -> List[Dict[str, Any]]:
-        root_bridge_neighbor_list = []
-        root_bridge_neighbors = root_bridge_data.get("neighbors")
-
-        for neighbor in root_bridge_neighbors:
-            #neighbor_name = neighbor.get("neighbor").split(".")[0]
-            neighbor_name = neighbor.get("neighbor")
-            root_bridge_neighbor_list.append(neighbor_name)
-        #print("\nroot_bridge_neighbor_list:\n", root_bridge_neighbor_list)
-        
-        for root_bridge_neighbor in root_bridge_neighbor_list:
-            for result in results:
-                if root_bridge_neighbor == result.get("prompt"):
-                    node = {
-                        "id": result.get("id"),
-                        "label": result.get("label"),
-                        "level": 1, # 1 because this node is a root bridge neighbor
-                        "title": result.get("title"),
-                        "priority": result.get("priority"),
-                        "mac_address": result.get("mac_address")
-                    }
-                    nodes.append(node)
-                    result["level"] = 1 # Update results dictionary changing from 9999 to 1 for root bridge neighbors
-        return nodes
-
-    nodes = calculate_nodes_for_level_1(nodes, root_bridge_data, results)
-    #print("\nLevel 1 - nodes:\n", nodes)
-
-    # Level > 1: Remaining nodes
-    #print("\nFunction: calculate_nodes_with_level_higher_than_1()")
-    def calculate_nodes_with_level_higher_than_1(nodes) -> List[Dict[str, Any]]:
-        current_level = max(node.get("level") for node in nodes)
-        #print("\ncurrent_level:", current_level)
-
-        nodes_to_analize = [
-            node for node in nodes if node.get("level") == current_level
-        ]
+    # Level >= 1: Breadth-first traversal of the CDP neighbors starting from the root bridge.
+    # A device is visited only once (when its level is still 9999), so this is O(devices + CDP entries)
+    # for any depth of the tree and stops as soon as there are no more devices to visit
+    queue = deque([root_bridge_data.get("prompt")])
+    while queue:
+        prompt = queue.popleft()
+        current_level = index.by_prompt[prompt].get("level")
+
+        for neighbor in index.neighbors.get(prompt, []):
+            result = index.by_prompt.get(neighbor)
+            if result and result.get("level") == 9999:
+                result["level"] = current_level + 1 # Update results dictionary changing from 9999 to the level found
+                nodes.append(build_node(result, current_level + 1))
+                queue.append(neighbor)
 
-        #print(f"\nnodes to analize because we are in level {current_level}")
-        #print("nodes to analize:", nodes_to_analize)
-
-        neighbors_data = []
-        for node in nodes_to_analize:
-            node_name = node.get("label")
-            #print("\nnode name to analize:", node_name)
-            for result in results:
-                if result.get("label") == node_name:
-                    neighbors = result.get("cdp_output_parsed")
-                    #print("\nneighbors:", neighbors)
-                    for neighbor in neighbors:
-                        #neighbor_name = neighbor.get("neighbor").split(".")[0]
-                        neighbor_name = neighbor.get("neighbor")
-                        #print("--", neighbor_name)
-                        neighbors_data.append(neighbor_name)
-        
-        for neighbor in neighbors_data:
-            #print("\nneighbor:", neighbor)
-            for result in results:
-                if result.get("label") == neighbor:
-                    level_found = result.get("level")
-                    #print("\nlevel_found:", level_found, "\n")
-                    if level_found == 9999:
-                        updated_level = current_level + 1
-                        result["level"] = updated_level
-                        #print(f"{neighbor}: Level changed from {level_found} to {updated_level}")
-                        node = {
-                            "id": result.get("id"),
-                            "label": result.get("label"),
-                            "level": updated_level,
-                            "title": result.get("title"),
-                            "priority": result.get("priority"),
-                            "mac_address": result.get("mac_address")
-                        }
-                        nodes.append(node)
-
-        #print("\nresults:", results)
-        #print("\nnodes:\n", nodes)
-        return nodes
-    
-    for i in range(1, 10):
-        #print(f"\nIteration {i = }")
-        nodes = calculate_nodes_with_level_higher_than_1(nodes)
     return nodes
 
                             
+def build_vlan_topology(vlan_id: str, port_roles: Dict[Tuple[str, str], str], index: TopologyIndex) -> Dict[str, Any]:
+    # port_roles: (prompt, interface) -> role for every port taking part in the spanning tree of this VLAN
+    members = {prompt for prompt, _ in port_roles}
+
+    edges: List[Dict[str, Any]] = []
+    edges_to_be_deleted: List[Dict[str, Any]] = []
+    blocked_interfaces = defaultdict(lambda: {"interfaces": []})
+    adjacency: Dict[str, List[str]] = defaultdict(list)
+    seen_edges = set()
+
+    for (prompt, interface), role in port_roles.items():
+        if role == "Alternate":
+            blocked_interfaces[prompt]["interfaces"].append(interface)
+
+        # A link carries this VLAN when the ports at both ends take part in its spanning tree
+        cdp_entry = index.neighbor_by_interface.get((prompt, interface))
+        if not cdp_entry:
+            continue
+        neighbor_prompt = cdp_entry.get("neighbor")
+        neighbor_interface = cdp_entry.get("neighbor_interface")
+        if neighbor_prompt not in members or (neighbor_prompt, neighbor_interface) not in port_roles:
+            continue
+
+        switch_id = index.get_id(prompt)
+        neighbor_id = index.get_id(neighbor_prompt)
+        adjacency[prompt].append(neighbor_prompt)
+
+        if role == "Alternate":
+            edges_to_be_deleted.append({"from": switch_id, "to": neighbor_id})
+
+        edge_tuple = tuple(sorted((switch_id, neighbor_id)))
+        if edge_tuple not in seen_edges:
+            seen_edges.add(edge_tuple)
+            title = f"{prompt}: {interface}\n⇆\n{neighbor_prompt}: {neighbor_interface}"
+            edges.append({'from': switch_id, 'to': neighbor_id, "title": title})
+
+    vlan_topology = {
+        "vlan_id": vlan_id,
+        "root_bridge": "",
+        "nodes": [],
+        "edges": [],
+        "edges_with_blocked_links": [],
+        "blocked_interfaces": [{k: v} for k, v in blocked_interfaces.items()],
+        "error": False,
+        "error_description": ""
+    }
+
+    root_prompt = next((prompt for prompt in sorted(members) if index.by_prompt[prompt].get("stp_vlans", {}).get(vlan_id, {}).get("is_root")), None)
+    if root_prompt is None:
+        vlan_topology["error"] = True
+        vlan_topology["error_description"] = f"No root bridge found for VLAN {vlan_id}"
+        return vlan_topology
+
+    # Same breadth-first traversal as process_nodes, restricted to the links carrying this VLAN
+    def build_node(prompt, level) -> Dict[str, Any]:
+        result = index.by_prompt[prompt]
+        bridge_id = result.get("stp_vlans", {}).get(vlan_id, {})
+        return {
+            "id": result.get("id"),
+            "label": result.get("label"),
+            "level": level,
+            "title": result.get("title"),
+            "priority": bridge_id.get("priority"),
+            "mac_address": bridge_id.get("mac_address")
+        }
+
+    levels = {root_prompt: 0}
+    nodes = [build_node(root_prompt, 0)]
+    queue = deque([root_prompt])
+    while queue:
+        prompt = queue.popleft()
+        for neighbor_prompt in adjacency[prompt]:
+            if neighbor_prompt not in levels:
+                levels[neighbor_prompt] = levels[prompt] + 1
+                nodes.append(build_node(neighbor_prompt, levels[neighbor_prompt]))
+                queue.append(neighbor_prompt)
+
+    blocked_edge_keys = {tuple(sorted((edge["from"], edge["to"]))) for edge in edges_to_be_deleted}
+    edges_finally_deleted = [edge for edge in edges if tuple(sorted((edge["from"], edge["to"]))) in blocked_edge_keys]
+
+    vlan_topology["root_bridge"] = root_prompt
+    vlan_topology["nodes"] = update_node_title_with_level_info(nodes)
+    vlan_topology["edges"] = [edge for edge in edges if tuple(sorted((edge["from"], edge["to"]))) not in blocked_edge_keys]
+    vlan_topology["edges_with_blocked_links"] = set_options_to_blocked_edges(edges_finally_deleted, [dict(edge) for edge in edges])
+    return vlan_topology
+
+def vlan_number(vlan_id) -> int:
+    # VLAN ids sort numerically, ids that are not numbers first
+    return int(vlan_id) if str(vlan_id).isdigit() else -1
+
+
+def build_vlan_topologies(results: List[Dict[str, Any]], index: TopologyIndex = None) -> Dict[str, Dict[str, Any]]:
+    index = index or TopologyIndex(results)
+
+    # One pass over the parsed STP data of every device, grouping port roles by VLAN (the TextFSM
+    # template fills VLAN_ID down). Each VLAN is then built only from its own ports
+    port_roles_by_vlan: Dict[str, Dict[Tuple[str, str], str]] = defaultdict(dict)
+    for result in results:
+        if result.get("status") != "success":
+            continue
+        prompt = result.get("prompt")
+        for entry in result.get("stp_output_parsed") or []:
+            port_roles_by_vlan[entry.get("vlan_id")][(prompt, entry.get("interface"))] = entry.get("role")
+
+    return {
+        vlan_id: build_vlan_topology(vlan_id, port_roles, index)
+        for vlan_id, port_roles in sorted(port_roles_by_vlan.items(), key=lambda item: vlan_number(item[0]))
+    }
+
+
+def find_root_bridge_result(results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # With PVST+/RPVST each VLAN can have its own root bridge, so the root of the main graph is the
+    # root of STP_ROOT_VLAN (default: the lowest VLAN with a root among the devices). Results are
+    # scanned by device ID, so the choice does not depend on the order the devices were collected in
+    root_vlan = os.getenv("STP_ROOT_VLAN", "")
+    ordered_results = sorted(
+        (result for result in results if result.get("device_type") == "cisco_ios"),
+        key=lambda result: (result.get("id") if isinstance(result.get("id"), int) else float("inf"), str(result.get("device")), str(result.get("port"))),
+    )
+
+    candidates = []
+    for result in ordered_results:
+        for vlan_id, vlan in (result.get("stp_vlans") or {}).items():
+            if vlan.get("is_root") and (not root_vlan or vlan_number(vlan_id) == vlan_number(root_vlan)):
+                candidates.append((vlan_number(vlan_id), result))
+    if candidates:
+        return min(candidates, key=lambda candidate: candidate[0])[1]
+
+    # Devices parsed without per-VLAN data (other platforms): first one, by device ID, whose output says so
+    for result in ordered_results:
+        if CISCO_STP_RAW_OUTPUT_ROOT_BRIDGE_TEXT in (result.get("stp_output_raw") or ""):
+            return result
+    return None
+
+
 def find_root_bridge(results: List[Dict[str, Any]]) -> Dict[str, Any]:
     root_bridge_data: Dict[str, Any] = {
         "device": "",
@@ -478,26 +471,23 @@ def find_root_bridge(results: List[Dict[str, Any]]) -> Dict[str, Any]:
         "neighbors": ""
     }
 
-    CISCO_STP_RAW_OUTPUT_ROOT_BRIDGE_TEXT = "This bridge is the root"
-
-    for result in results:
-        if result.get("device_type") == "cisco_ios":
-            if CISCO_STP_RAW_OUTPUT_ROOT_BRIDGE_TEXT in result.get("stp_output_raw"):
-                root_bridge_data["device"] = result.get("device")
-                root_bridge_data["device_type"] = result.get("device_type")
-                root_bridge_data["prompt"] = result.get("prompt")
-                root_bridge_data["level"] = 0 # 0 because this node is the root bridge and that is why it has level 0
-                root_bridge_data["id"] = result.get("id")
-                root_bridge_data["label"] = result.get("label")
-                root_bridge_data["title"] = result.get("title")
-                root_bridge_data["neighbors"] = result.get("cdp_output_parsed")
-                root_bridge_data["priority"] = result.get("priority")
-                root_bridge_data["mac_address"] = result.get("mac_address")
-
-                result["level"] = 0 # Update results dictionary changing from 9999 to 0 for root bridge level value
-                return root_bridge_data
-
-    root_bridge_data = {}
+    result = find_root_bridge_result(results)
+    if result is None:
+        root_bridge_data = {}
+        return root_bridge_data
+
+    root_bridge_data["device"] = result.get("device")
+    root_bridge_data["device_type"] = result.get("device_type")
+    root_bridge_data["prompt"] = result.get("prompt")
+    root_bridge_data["level"] = 0 # 0 because this node is the root bridge and that is why it has level 0
+    root_bridge_data["id"] = result.get("id")
+    root_bridge_data["label"] = result.get("label")
+    root_bridge_data["title"] = result.get("title")
+    root_bridge_data["neighbors"] = result.get("cdp_output_parsed")
+    root_bridge_data["priority"] = result.get("priority")
+    root_bridge_data["mac_address"] = result.get("mac_address")
+
+    result["level"] = 0 # Update results dictionary changing from 9999 to 0 for root bridge level value
     return root_bridge_data
 
 
@@ -519,16 +509,53 @@ def get_prompt(connection, device_type) -> str:
     return prompt
 
 
+def send_commands_batched(connection, commands: List[str]) -> List[str]:
+    # All the commands are written to the channel at once, so the device runs them back to back and
+    # we only wait for the prompt once. Each output is delimited by the echo of its own command at the
+    # start of a line (e.g. "SW1#show cdp neighbors"), searched in order, and the last one by the final
+    # prompt. The prompt before the first echo is optional: on a reused session it has already been
+    # read by find_prompt, send_command or the previous batch
+    prompt_pattern = re.escape(connection.base_prompt) + r"[>#]"
+    delimiters = [re.compile(f"^(?:{prompt_pattern})?{re.escape(command)}", re.MULTILINE) for command in commands]
+
+    # Same time budget as sending the commands one by one with send_command
+    read_timeout = 10.0 * len(commands)
+    connection.write_channel("".join(command + connection.RETURN for command in commands))
+    output = connection.read_until_pattern(pattern=delimiters[-1].pattern, re_flags=re.MULTILINE, read_timeout=read_timeout)
+    output += connection.read_until_pattern(pattern=prompt_pattern, read_timeout=read_timeout)
+    output = connection.normalize_linefeeds(output)
+
+    matches = []
+    position = 0
+    for delimiter in delimiters:
+        match = delimiter.search(output, position)
+        if match is None:
+            raise ValueError(f"Echo of a batched command has not been found: {delimiter.pattern}")
+        matches.append(match)
+        position = match.end()
+    final_prompt = re.compile(prompt_pattern).search(output, position)
+    ends = [match.start() for match in matches[1:]] + [final_prompt.start() if final_prompt else len(output)]
+
+    outputs = []
+    for match, end in zip(matches, ends):
+        # Like send_command: without the rest of the command echo line and without the prompt line
+        command_output = output[match.end():end].partition("\n")[2]
+        if command_output.endswith("\n"):
+            command_output = command_output[:-1]
+        outputs.append(command_output)
+
+    return outputs
+
+
 def print_execution_time(end_total: float):
     end_total = round(end_total, 2)
 
     if end_total > 1:
         unit = "s"
-        print(f"\nTotal script execution time: {end_total} {unit}")
     else:
         unit = "ms"
         end_total *= 1000
-        print(f"\nTotal script execution time: {end_total} {unit}")
+    logger.info("Total script execution time: %s %s", end_total, unit)
     
     return end_total, unit
 
@@ -539,47 +566,12 @@ def load_credentials(CREDENTIALS_FILE: str) -> List[Dict[str, Any]]:
         with open(CREDENTIALS_FILE, "r") as file:
             devices = json.load(file)
     except FileNotFoundError:
-        print(f"Error: File {CREDENTIALS_FILE} was not found")
+        logger.error("File %s was not found", CREDENTIALS_FILE)
 
         return devices
     
     return devices
 
-def extract_bridge_id(stp_output_raw, device_type):
-    if device_type == "cisco_ios":
-        bridge_id = {}
-        in_bridge_id_section = False
-
-        # Split the input text into lines
-        lines = stp_output_raw.split("\n")
-
-        # Process each line
-        for line in lines:
-            line = line.strip()
-
-            # Check for Bridge ID
-            if line.startswith("Bridge ID"):
-                in_bridge_id_section = True
-                # Extract the priority
-                priority_match = re.search(r"Priority\s+(\d+)", line)
-                if priority_match:
-                    bridge_id["priority"] = priority_match.group(1)
-                continue
-
-            # If we're in the Bridge ID section, look for the Address
-            if in_bridge_id_section:
-                if line.startswith("Address"):
-                    # Extract the address
-                    address_match = re.search(r"Address\s+([0-9a-fA-F.]+)", line)
-                    if address_match:
-                        bridge_id["mac_address"] = address_match.group(1)
-                        break  # We've found the address, so we can stop processing
-                elif line.strip() == "":
-                    # If we encounter an empty line, we've moved past the Bridge ID section
-                    break
-
-        return bridge_id["priority"], bridge_id["mac_address"]
-
 def obtain_some_values_from_version_command(parsed_version_output, device_type) -> Tuple[str, str, str]:
     if device_type == "cisco_ios":
         # Initialize default values
@@ -662,19 +654,25 @@ def checks_all_prompts_are_different(results) -> bool:
 
     if duplicates:
         error_checking_prompts = True
-        print("TEST: FAILED. Duplicated 'prompt' values have been found. Ending here")
-        for result in results:
-            prompt = result.get('prompt')
-            print(f"Prompt: {prompt}")
+        logger.error("Duplicated 'prompt' values have been found: %s. Ending here", sorted({prompt for _, prompt in duplicates}))
     else:
-        print("TEST: PASSED. All 'prompt' values are different")
+        logger.info("All 'prompt' values are different")
 
     return error_checking_prompts
 
-def connect_to_device(device: Dict[str, Any]) -> Dict[str, Any]:
-    global connection_id
+def get_netmiko_device(device: Dict[str, Any]) -> Dict[str, Any]:
+    # netmiko_device dictionary needs to have the correct arguments in order to use within ConnectHandler,
+    # so to fix it we needed to eliminate some key: value pairs from device dictionary
+    list_of_keys_to_delete = ["spanning_tree_command", "cdp_neighbors_command", "version_command", "stp_template", "cdp_template", "version_template", "batch_commands"]
+    return {
+        k: v
+        for k, v in device.items()
+        if k not in list_of_keys_to_delete
+    }
+
 
-    result: Dict[str, Any] = {
+def build_empty_result(device: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "device": device.get("host", ""),
         "port": device.get("port", ""),
         "device_type": device.get("device_type", ""),
@@ -689,110 +687,182 @@ def connect_to_device(device: Dict[str, Any]) -> Dict[str, Any]:
         "version": "",
         "serial": "",
         "uptime": "",
+        "version_cached": False,
         "id": "",
         "label": "",
         "title": "",
         "level": "",
         "priority": "",
-        "mac_address": ""
+        "mac_address": "",
+        "stp_vlans": {},
+        "timings": []
     }
 
+
+def capture_device_output(device: Dict[str, Any], device_id: int) -> Dict[str, Any]:
+    # I/O stage: only runs the commands and keeps their raw output. Parsing is done
+    # afterwards by parse_device_output, so it does not hold the SSH worker threads
+    result: Dict[str, Any] = build_empty_result(device)
+
     # STP
     spanning_tree_command = device.get("spanning_tree_command", "show spanning-tree")
-    stp_template_name = device.get("stp_template")
 
     # CDP
     cdp_neighbors_command = device.get("cdp_neighbors_command", "show cdp neighbors")
-    cdp_template_name = device.get("cdp_template")
 
     # Version 
     version_command = device.get("version_command", "show version")
-    version_template_name = device.get("version_template")
 
-    # netmiko_device dictionary needs to have the correct arguments in order to use within ConnectHandler,
-    # so to fix it we needed to eliminate some key: value pairs from device dictionary
-    list_of_keys_to_delete = ["spanning_tree_command", "cdp_neighbors_command", "version_command", "stp_template", "cdp_template", "version_template"]
-    netmiko_device = {
-        k: v
-        for k, v in device.items()
-        if k not in list_of_keys_to_delete
-    }
+    netmiko_device = get_netmiko_device(device)
+
+    # Shorter connection timeouts for devices that usually answer fast (see graph/device_health.py),
+    # unless they are set in the credentials file
+    for name, timeout in get_device_health().get_timeouts(SessionPool.get_key(netmiko_device)).items():
+        netmiko_device.setdefault(name, timeout)
 
     try:
-        with ConnectHandler(**netmiko_device) as connection:
-            if "secret" in netmiko_device:
-                connection.enable()  # Enter privileged EXEC mode
+        # Sessions are reused across sweeps, so only the first collection of each device pays for
+        # the SSH key exchange, enable() and the prompt discovery
+        with get_session_pool().session(netmiko_device) as session:
+            connection = session.connection
+
+            # connect and enable() are only timed when the session has just been opened
+            if session.uses == 0:
+                result["timings"].extend(session.open_timings)
 
             device_type = netmiko_device.get("device_type")
 
             # Get prompt for each device
-            result["prompt"] = get_prompt(connection, device_type)
-
-            ## STP
-            # 1. Get raw STP data
-            result["stp_output_raw"] = connection.send_command(
-                command_string=spanning_tree_command
-            )
-
-            # 2. Parse STP data locally
-            stp_output_raw = result.get("stp_output_raw")
-            parsed_stp_output = get_structured_data(
-                raw_output=stp_output_raw,
-                platform=connection.device_type,
-                command=spanning_tree_command,
-                template=f"my_own_ntc_templates/modified/{stp_template_name}"
-            )
-
-            # 3. Post processing for STP parsed data 
-            parsed_stp_output = modify_stp_parsed_data(parsed_stp_output, device_type)
-
-            # 4. Assign post processed data to dictionary
-            result["stp_output_parsed"] = parsed_stp_output
-
-            ## CDP
-            # 1. Get raw CDP data
-            result["cdp_output_raw"] = connection.send_command(
-                command_string=cdp_neighbors_command
-            )
-
-            # 2. Parse CDP data locally
-            parsed_cdp_output = get_structured_data(
-                raw_output=result.get("cdp_output_raw"),
-                platform=connection.device_type,
-                command=cdp_neighbors_command,
-                template=f"my_own_ntc_templates/modified/{cdp_template_name}"
-            )
-
-            # 3. Post processing for CDP parsed data 
-            parsed_cdp_output = modify_cdp_parsed_data(parsed_cdp_output, device_type)
-
-            # 4. Assign post processed data to dictionary
-            result["cdp_output_parsed"] = parsed_cdp_output
-
-            ## Version
-            # 1. Get raw version data
-            result["version_output_raw"] = connection.send_command(
-                command_string=version_command
-            )
-
-            # 2. Parse version data locally
-            parsed_version_output = get_structured_data(
-                raw_output=result.get("version_output_raw"),
-                platform=connection.device_type,
-                command=version_command,
-                template=f"my_own_ntc_templates/modified/{version_template_name}"
-            )
-
-            # 3. Post processing for Version parsed data 
+            if not session.prompt:
+                session.prompt = get_prompt(connection, device_type)
+            result["prompt"] = session.prompt
+
+            # version and serial almost never change, so show version is skipped while the cached
+            # results of the device are fresh. A new session may come from a reload, so it is always run then
+            cached_version = get_version_cache().get(result, new_session=session.uses == 0)
+            if cached_version is not None:
+                result["version_cached"] = True
+                result["version"] = cached_version.get("version")
+                result["serial"] = cached_version.get("serial")
+                result["uptime"] = cached_version.get("uptime")
+
+            if device.get("batch_commands"):
+                # Get raw STP, CDP and version data in a single round-trip
+                commands = [spanning_tree_command, cdp_neighbors_command]
+                if cached_version is None:
+                    commands.append(version_command)
+                with timed(result["timings"], "send_command", "batch"):
+                    outputs = send_commands_batched(connection, commands)
+                result["stp_output_raw"], result["cdp_output_raw"] = outputs[:2]
+                if cached_version is None:
+                    result["version_output_raw"] = outputs[2]
+            else:
+                ## STP
+                # Get raw STP data
+                with timed(result["timings"], "send_command", spanning_tree_command):
+                    result["stp_output_raw"] = connection.send_command(
+                        command_string=spanning_tree_command
+                    )
+
+                ## CDP
+                # Get raw CDP data
+                with timed(result["timings"], "send_command", cdp_neighbors_command):
+                    result["cdp_output_raw"] = connection.send_command(
+                        command_string=cdp_neighbors_command
+                    )
+
+                ## Version
+                # Get raw version data
+                if cached_version is None:
+                    with timed(result["timings"], "send_command", version_command):
+                        result["version_output_raw"] = connection.send_command(
+                            command_string=version_command
+                        )
+
+            ## Others
+            # Assign ID to each device for being used in nodes later
+            # The ID is the position of the device in the credentials file, so it does not depend
+            # on the order in which the concurrent connections finish
+            result["id"] = device_id
+
+            # Assign a label to each device for being used in nodes later
+            # label is the exact info as prompt
+            result["label"] = result.get("prompt")
+
+            # Assign a title to each device for being used in nodes later
+            result["title"] = f"SVI: {device.get("host")}\nPlatform: {device.get("device_type")}"
+            
+            # Assign a value of 9999 as a placeholder to each device. It will be updated in the process_nodes function later
+            result["level"] = 9999
+    except NetMikoAuthenticationException:
+        result["status"] = "authentication_failure"
+    except NetMikoTimeoutException:
+        result["status"] = "timeout"
+    except Exception as e:
+        result["status"] = f"other_failure:{str(e)}"
+    return result
+
+
+def parse_device_output(result: Dict[str, Any], device: Dict[str, Any]) -> Dict[str, Any]:
+    # CPU stage: parses the raw outputs captured by capture_device_output. It only uses its
+    # arguments and module level functions, so it can run in a worker process (see graph/parse_pool.py)
+    if result.get("status") != "success":
+        return result
+
+    device_type = device.get("device_type")
+    stp_template_name = device.get("stp_template")
+    cdp_template_name = device.get("cdp_template")
+    version_template_name = device.get("version_template")
+    # Parse timings go back to the main process with the result (see Metrics.observe_device)
+    timings = result.setdefault("timings", [])
+
+    try:
+        ## STP
+        # 1. Parse STP data locally. On Cisco IOS, the interface table, the bridge IDs and the timers
+        # of every VLAN are read in a single pass over the output (see graph/stp_parser.py)
+        stp_output_raw = result.get("stp_output_raw")
+        with timed(timings, "parse", "stp"):
+            if device_type == "cisco_ios":
+                parsed_stp = parse_stp_output(stp_output_raw)
+                parsed_stp_output = parsed_stp.get("interfaces")
+            else:
+                parsed_stp = None
+                parsed_stp_output = get_template_registry().parse(stp_template_name, stp_output_raw)
+
+        # 2. Post processing for STP parsed data 
+        parsed_stp_output = modify_stp_parsed_data(parsed_stp_output, device_type)
+
+        # 3. Assign post processed data to dictionary
+        result["stp_output_parsed"] = parsed_stp_output
+
+        ## CDP
+        # 1. Parse CDP data locally
+        with timed(timings, "parse", "cdp"):
+            parsed_cdp_output = get_template_registry().parse(cdp_template_name, result.get("cdp_output_raw"))
+
+        # 2. Post processing for CDP parsed data 
+        parsed_cdp_output = modify_cdp_parsed_data(parsed_cdp_output, device_type)
+
+        # 3. Assign post processed data to dictionary
+        result["cdp_output_parsed"] = parsed_cdp_output
+
+        ## Version
+        # Skipped when version, serial and uptime come from the version cache
+        if not result.get("version_cached"):
+            # 1. Parse version data locally
+            with timed(timings, "parse", "version"):
+                parsed_version_output = get_template_registry().parse(version_template_name, result.get("version_output_raw"))
+
+            # 2. Post processing for Version parsed data 
             parsed_version_output = modify_version_parsed_data(parsed_version_output, device_type)
 
-            # 4. Assign post processed data to dictionary
+            # 3. Assign post processed data to dictionary
             result["version_output_parsed"] = parsed_version_output
 
-            # 5. Get values from version command
+            # 4. Get values from version command
             version, serial, uptime = obtain_some_values_from_version_command(parsed_version_output, device_type)
 
-            # 6. Set each value in results dictionary
+            # 5. Set each value in results dictionary
             # version
             result["version"] = version
 
@@ -802,76 +872,360 @@ def connect_to_device(device: Dict[str, Any]) -> Dict[str, Any]:
             # uptime
             result["uptime"] = uptime
 
-            # 7. Set Priority and MAC Address for the node
-            priority, mac_address = extract_bridge_id(stp_output_raw, device_type)
+        if parsed_stp is not None:
+            # 6. Set Priority and MAC Address for the node
+            priority, mac_address = get_bridge_id(parsed_stp)
             result["priority"] = priority
             result["mac_address"] = mac_address
 
-            ## Others
-            # Assign ID to each device for being used in nodes later
-            result["id"] = connection_id
-
-            # Assign a label to each device for being used in nodes later
-            # label is the exact info as prompt
-            result["label"] = result.get("prompt")
-
-            # Assign a title to each device for being used in nodes later
-            result["title"] = f"SVI: {device.get("host")}\nPlatform: {device.get("device_type")}"
-            
-            # Assign a value of 9999 as a placeholder to each device. It will be updated in the process_nodes function later
-            result["level"] = 9999
-
-            # Increase connection_id
-            connection_id += 1
-    except NetMikoAuthenticationException:
-        result["status"] = "authentication_failure"
-    except NetMikoTimeoutException:
-        result["status"] = "timeout"
+            # 7. Set Priority, MAC Address, root bridge flag and timers for each VLAN
+            result["stp_vlans"] = get_bridge_ids_per_vlan(parsed_stp)
     except Exception as e:
         result["status"] = f"other_failure:{str(e)}"
     return result
 
 
-def main():
-    global connection_id
-    connection_id = 0
+def log_device_summary(result: Dict[str, Any]) -> None:
+    # One line per device instead of the whole result: the raw outputs alone can be several KB
+    status = result.get("status", "")
+    fields = {
+        "device": f'{result.get("device")}:{result.get("port")}',
+        "prompt": result.get("prompt"),
+        "status": status.split(":")[0],
+        "stp_entries": len(result.get("stp_output_parsed") or []),
+        "cdp_neighbors": len(result.get("cdp_output_parsed") or []),
+        "vlans": len(result.get("stp_vlans") or {}),
+        "version_cached": result.get("version_cached"),
+        "seconds": round(sum(seconds for _, _, seconds in result.get("timings") or []), 3),
+    }
+    if status == "success":
+        logger.info("Device collected", extra={"fields": fields})
+    else:
+        logger.warning("Device failed: %s", status, extra={"fields": fields})
+
+
+def connect_to_device(device: Dict[str, Any], device_id: int) -> Dict[str, Any]:
+    # Both stages in the calling thread
+    return parse_device_output(capture_device_output(device, device_id), device)
+
+
+async def collect_devices(devices: List[Dict[str, Any]], connect: Callable[[Dict[str, Any], int], Dict[str, Any]] = capture_device_output, on_result: Callable[[Dict[str, Any]], None] = None, parse: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]] = parse_device_output) -> List[Dict[str, Any]]:
+    # Netmiko sessions are blocking, so each one runs in a worker thread. The number of threads
+    # is bounded by STP_MAX_CONCURRENT_SESSIONS instead of growing with the number of devices,
+    # and the semaphore keeps the rest of the devices waiting in the event loop (not in threads)
+    max_sessions = int(os.getenv("STP_MAX_CONCURRENT_SESSIONS", 64))
+    semaphore = asyncio.Semaphore(max_sessions)
+    loop = asyncio.get_running_loop()
+
+    # Raw outputs are parsed in a process pool (STP_PARSE_WORKERS processes), so parsing big
+    # outputs does not compete for the GIL with the I/O threads. At most 2 outputs per worker
+    # are waiting to be parsed: when the queue is full, the I/O threads wait before taking the
+    # next device, so captured outputs do not pile up in memory. parse=None skips this stage
+    parse_pool = get_parse_pool() if parse is not None else None
+    parse_queue = asyncio.Semaphore(2 * get_parse_workers()) if parse_pool is not None else None
+
+    # Raw outputs of every device (failures included) are archived before being parsed, so the
+    # sweep can be replayed without SSH (see graph/raw_archive.py)
+    raw_archive = get_raw_archive()
+    captured: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+
+    # Connect, enable, command and parse timings of each device (GET /metrics)
+    metrics = get_metrics()
+
+    # Devices that failed several sweeps in a row are skipped and probed in the background,
+    # so they do not make every sweep wait for their timeouts (see graph/device_health.py)
+    device_health = get_device_health()
+
+    # Devices whose SSH port does not accept a TCP connection are reported as timeouts right
+    # away, instead of each one waiting for Netmiko's timeouts (see graph/reachability.py).
+    # Every device is checked at the same time, and its collection starts as soon as its own
+    # check passes. Devices with an idle pooled session are not checked: the pool health
+    # checks the session itself, and a dead one is reopened with the adaptive timeouts
+    precheck_timeout = get_precheck_timeout()
+    precheck_slots = asyncio.Semaphore(MAX_CONCURRENT_CHECKS)
+    session_pool = get_session_pool()
+    unreachable: Set[int] = set()
+
+    def store_version(result: Dict[str, Any]) -> Dict[str, Any]:
+        # The version cache lives in this process, so it is updated here and not in the parse workers
+        if result.get("status") == "success" and result.get("version_output_raw"):
+            get_version_cache().store(result)
+        return result
+
+    def probe(device: Dict[str, Any], device_id: int) -> Dict[str, Any]:
+        # The outputs of the probe are not parsed, but its session goes back to the pool and the
+        # next sweep reuses it: show version is collected again then, since a device that was
+        # down may have reloaded or been replaced (see VersionCache.expire)
+        result = connect(device, device_id)
+        get_version_cache().expire(result)
+        return result
+
+    results: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_sessions, len(devices)))) as executor:
+        async def run(device: Dict[str, Any], device_id: int) -> Dict[str, Any]:
+            key = SessionPool.get_key(device)
+            if device_health.is_open(key):
+                device_health.probe_if_due(key, functools.partial(probe, device, device_id))
+                result = build_empty_result(device)
+                result["status"] = "circuit_open"
+                return result
+
+            if precheck_timeout > 0 and not session_pool.has_idle(key):
+                async with precheck_slots:
+                    reachable = await is_reachable(*key, precheck_timeout)
+                if not reachable:
+                    unreachable.add(device_id)
+                    result = build_empty_result(device)
+                    result["status"] = "timeout"
+                    device_health.record(key, result)
+                    if raw_archive is not None:
+                        captured[device_id] = (device, dict(result))
+                    return result
+
+            async with semaphore:
+                result = await loop.run_in_executor(executor, connect, device, device_id)
+                device_health.record(key, result)
+                if raw_archive is not None:
+                    # Inline parsing updates the result in place
+                    captured[device_id] = (device, dict(result))
+                if parse is None or result.get("status") != "success":
+                    return result
+                if parse_pool is None:
+                    return store_version(await loop.run_in_executor(executor, parse, result, device))
+                await parse_queue.acquire()
+
+            try:
+                return store_version(await loop.run_in_executor(parse_pool, parse, result, device))
+            except BrokenProcessPool as e:
+                # A worker process died: this sweep reports the device as failed and the next one starts a new pool
+                close_parse_pool()
+                result["status"] = f"other_failure:{str(e)}"
+                return result
+            finally:
+                parse_queue.release()
+
+        tasks = [
+            asyncio.create_task(run(device, device_id)) for device_id, device in enumerate(devices)
+        ]
+
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            results.append(result)
+            metrics.observe_device(result)
+
+            # Lets the caller report each device as soon as it has been collected (see /stp-graph/stream)
+            if on_result is not None:
+                on_result(result)
+
+    if unreachable:
+        logger.info("%d/%d device(s) not reachable over TCP, skipped", len(unreachable), len(devices))
+
+    get_version_cache().flush()
+
+    if raw_archive is not None and captured:
+        path = await asyncio.to_thread(raw_archive.write, [captured[device_id] for device_id in sorted(captured)])
+        logger.info("Raw outputs archived in %s", path)
+
+    return results
+
+
+async def replay_devices(entries: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Same parse stage as collect_devices, on the results captured by a previous sweep and read
+    # from its raw archive. Nothing is sent to the devices and the version cache is not updated
+    loop = asyncio.get_running_loop()
+    parse_pool = get_parse_pool()
+
+    async def run(device: Dict[str, Any], archived_result: Dict[str, Any]) -> Dict[str, Any]:
+        # Keys set by the parse stage start empty, as in capture_device_output
+        result = {
+            "stp_output_parsed": "",
+            "cdp_output_parsed": "",
+            "version_output_parsed": "",
+            "priority": "",
+            "mac_address": "",
+            "stp_vlans": {},
+            **archived_result,
+        }
+        if result.get("status") != "success":
+            return result
+        try:
+            return await loop.run_in_executor(parse_pool, parse_device_output, result, device)
+        except BrokenProcessPool as e:
+            close_parse_pool()
+            result["status"] = f"other_failure:{str(e)}"
+            return result
+
+    return list(await asyncio.gather(*(run(device, result) for device, result in entries)))
+
 
-    # 1. Load credentials
-    print("1. Load credentials")
-    CREDENTIALS_FILE: str = "./device_credentials.json"
-    devices: List[Dict[str, Any]] = load_credentials(CREDENTIALS_FILE)
-    if not devices:
+def build_topology(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Duration of each step (GET /metrics)
+    stages = get_metrics().stage
+
+    # Nodes, edges and results are only dumped at DEBUG level, so formatting them costs nothing at INFO
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    # 6. Find root bridge
+    logger.debug("6. Find root bridge")
+    with stages.time(stage="find_root_bridge"):
+        root_bridge_data = find_root_bridge(results)
+    if not root_bridge_data:
+        logger.warning("No root bridge found. Ending here")
         data = {
             "nodes": [],
             "edges": [],
             "error": True,
-            "error_description": f"File {CREDENTIALS_FILE} has not been found"
+            "error_description": "No root bridge found"
         }
         return data 
+    logger.info("Root bridge has been found: %s", root_bridge_data.get("prompt"))
+    logger.debug("Root bridge data: %s", root_bridge_data)
 
-    total_devices: int = len(devices)
-    if total_devices == 1:
-        print(f"1 device found in {CREDENTIALS_FILE} file")
-    else:
-        print(f"{total_devices} devices found in {CREDENTIALS_FILE} file")
+    # Hash indexes used by the following steps instead of scanning results for every lookup
+    with stages.time(stage="topology_index"):
+        index = TopologyIndex(results)
 
-    # 2. Connect to devices concurrently
-    print("\n2. Connect to devices concurrently")
-    results: List[Dict[str, Any]] = []
-    with ThreadPoolExecutor(max_workers=total_devices) as executor:
-        future_to_device = {
-            executor.submit(connect_to_device, device): device for device in devices
-        }
+    # 7. Build nodes
+    logger.debug("7. Build nodes")
+    with stages.time(stage="process_nodes"):
+        nodes = process_nodes(root_bridge_data, results, index)
+
+    # 7a. Update each node title with level information
+    logger.debug("7a. Update each node title with level information")
+    nodes = update_node_title_with_level_info(nodes)
+
+    if debug:
+        # 8. Log node information
+        log_node_information(nodes)
+
+        # 9. Log node tree structure
+        log_node_structure(nodes)
+
+    # 10. Build edges
+    logger.debug("10. Build edges")
+    with stages.time(stage="process_edges"):
+        edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names, edges_without_duplicated_with_blocked_links = process_edges(results, index)
+
+    # 11. Log edge information
+    if debug:
+        log_edge_information(edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names)
+
+    # 12. Identify edges where exist blocked interfaces (Role = Alternate)
+    logger.debug("12. Identify edges where exist blocked interfaces (Role = Alternate)")
+    with stages.time(stage="identify_blocked_links"):
+        edges_to_be_deleted = identify_blocked_links(results, index)
+
+    # 13. Remove edge(s)
+    logger.debug("13. Remove edge(s)")
+    with stages.time(stage="remove_blocked_links"):
+        edges_without_duplicated, edges_finally_deleted = remove_blocked_links(edges_to_be_deleted, edges_without_duplicated)
+    
+    # 14. Log updated edge information
+    if debug:
+        log_updated_edge_information(edges_without_duplicated)
+
+    # 15. Select specific data to be sent
+    logger.debug("15. Select specific data to be sent")
+    with stages.time(stage="select_specific_data"):
+        filtered_results = select_specific_data(results)
+
+    # 16. Set options to blocked edges
+    logger.debug("16. Set options to blocked edges")
+    with stages.time(stage="set_options_to_blocked_edges"):
+        edges_with_options = set_options_to_blocked_edges(edges_finally_deleted, edges_without_duplicated_with_blocked_links)
+
+    # 17. Log edges with options
+    if debug:
+        log_edges_with_options(edges_with_options)
+
+    # 18. Find blocked interfaces
+    logger.debug("18. Find blocked interfaces")
+    with stages.time(stage="find_blocked_interfaces"):
+        blocked_interfaces = find_blocked_interfaces(results)
+    logger.debug("Blocked interfaces: %s", blocked_interfaces)
 
-        for future in as_completed(future_to_device):
-            results.append(future.result())
+    # 18a. Build one spanning tree per VLAN (PVST+/RPVST)
+    logger.debug("18a. Build one spanning tree per VLAN")
+    with stages.time(stage="build_vlan_topologies"):
+        vlans = build_vlan_topologies(results, index)
 
-    print("DEBUG:")
+    # 19. Final data
+    data = {
+        "nodes": nodes,
+        "edges": edges_without_duplicated,
+        "edges_with_blocked_links": edges_with_options,
+        "blocked_interfaces": blocked_interfaces,
+        "results": filtered_results,
+        "vlans": vlans,
+        "error": False,
+        "error_description": ""
+    }
+    logger.info(
+        "Topology built", extra={"fields": {
+            "nodes": len(nodes),
+            "edges": len(edges_without_duplicated),
+            "blocked_links": len(edges_with_options) - len(edges_without_duplicated),
+            "blocked_interfaces": sum(len(v["interfaces"]) for entry in blocked_interfaces for v in entry.values()),
+            "vlans": len(vlans),
+        }}
+    )
+    if debug:
+        logger.debug("Final data:\n%s", pformat(data))
+
+    return data
+
+
+async def main(topology=None, on_result=None, replay_path=None):
+    # replay_path: raw archive of a previous sweep (see graph/raw_archive.py). The devices are not
+    # contacted: their archived outputs go through the same parse and graph steps, and the
+    # resulting topology is not saved
+    if replay_path is not None:
+        # 1. Load raw archive
+        logger.debug("1. Load raw archive")
+        header, entries = RawArchive.read(replay_path)
+        devices: List[Dict[str, Any]] = [device for device, _ in entries]
+        if not devices:
+            data = {
+                "nodes": [],
+                "edges": [],
+                "error": True,
+                "error_description": f"No devices found in raw archive {replay_path}"
+            }
+            return data
+        logger.info("%d device(s) captured at %s found in %s", len(devices), header.get('timestamp'), replay_path)
+
+        # 2. Parse the archived outputs
+        logger.debug("2. Parse the archived outputs")
+        results: List[Dict[str, Any]] = await replay_devices(entries)
+    else:
+        # 1. Load credentials
+        logger.debug("1. Load credentials")
+        CREDENTIALS_FILE: str = "./device_credentials.json"
+        devices: List[Dict[str, Any]] = load_credentials(CREDENTIALS_FILE)
+        if not devices:
+            data = {
+                "nodes": [],
+                "edges": [],
+                "error": True,
+                "error_description": f"File {CREDENTIALS_FILE} has not been found"
+            }
+            return data 
+
+        logger.info("%d device(s) found in %s file", len(devices), CREDENTIALS_FILE)
+
+        # 2. Connect to devices concurrently
+        logger.debug("2. Connect to devices concurrently")
+        results: List[Dict[str, Any]] = await collect_devices(devices, on_result=on_result)
+
+    # One line per device. The whole results, raw outputs included, are only dumped at DEBUG level
+    debug = logger.isEnabledFor(logging.DEBUG)
     for result in results:
-        pprint(result)
+        log_device_summary(result)
+        if debug:
+            logger.debug("Result of %s:%s:\n%s", result.get("device"), result.get("port"), pformat(result))
     
     # 3. Some checks before continuing
-    print("\n3. Some checks before continuing")
+    logger.debug("3. Some checks before continuing")
     error_checking_prompts = checks_all_prompts_are_different(results)
     if error_checking_prompts:
         data = {
@@ -883,48 +1237,45 @@ def main():
         return data
 
     # 4. Count successes and failures
-    print("\n4. Count successes and failures")
+    logger.debug("4. Count successes and failures")
     connection_counter: Counter = Counter()
     successful_connections: List[str] = []
     failed_connections: Dict[str, List[str]] = {
         "authentication_failure": [],
         "timeout": [],
-        "other_failure": []
+        "other_failure": [],
+        "circuit_open": []
     }
     for result in results:
-        status = result.get("status", "unknown")
+        # other_failure statuses carry the error message ("other_failure:<message>")
+        status = result.get("status", "unknown").split(":")[0]
         connection_counter[status] += 1
         device_info = f"{result['prompt']} - {result['device']}"
         if status == "success":
             successful_connections.append(device_info)
         else:
-            failed_connections[status].append(device_info)
-    print("Done")
+            failed_connections.setdefault(status, []).append(device_info)
 
-    # 5. Print results
-    print("\n5. Print results\n\nSummary of connections:")
+    # 5. Log results
     total_devices = len(devices)
     successful_count = connection_counter.get("success", 0)
     successful_percentage = 100 * successful_count / total_devices
-    print(f"--Successful connections: {successful_count}/{total_devices} ({successful_percentage:.1f}%)")
-    if successful_count > 0:
-        for device in successful_connections:
-            print(f"    {device}")
-
     failed_count = total_devices - successful_count
     failed_percentage = 100 * failed_count / total_devices
-    print(f"--Failed connections: {failed_count}/{total_devices} ({failed_percentage:.1f}%)")
 
-    all_statuses = {"authentication_failure", "timeout", "other_failure"}
+    all_statuses = set(failed_connections)
+    logger.info(
+        "Summary of connections: %d/%d successful (%.1f%%), %d/%d failed (%.1f%%)",
+        successful_count, total_devices, successful_percentage, failed_count, total_devices, failed_percentage,
+        extra={"fields": {status: connection_counter.get(status, 0) for status in sorted(all_statuses)}}
+    )
+    logger.debug("Successful connections: %s", successful_connections)
     for status in sorted(all_statuses):
-        count = connection_counter.get(status, 0)
-        print(f"  --{status}: {count}/{total_devices}")
-        if count > 0:
-            for device in failed_connections[status]:
-                print(f"      {device}")
+        if failed_connections[status]:
+            logger.warning("%s: %s", status, ", ".join(failed_connections[status]))
 
     if not successful_count:
-        print("\nNo successful connections were made. Ending here")
+        logger.error("No successful connections were made. Ending here")
         data = {
             "nodes": [],
             "edges": [],
@@ -933,96 +1284,25 @@ def main():
         }
         return data 
 
-    # 6. Find root bridge
-    print("\n6. Find root bridge")
-    root_bridge_data = find_root_bridge(results)
-    if not root_bridge_data:
-        print("\nNo root bridge found. Ending here")
-        data = {
-            "nodes": [],
-            "edges": [],
-            "error": True,
-            "error_description": "No root bridge found"
-        }
-        return data 
-    print(f"\nRoot bridge has been found:\n{root_bridge_data}")
-
-    # 7. Build nodes
-    print("\n7. Build nodes")
-    nodes = process_nodes(root_bridge_data, results)
-    print("Done")
-
-    # 7a. Update each node title with level information
-    print("\n7a. Update each node title with level information")
-    nodes = update_node_title_with_level_info(nodes)
-    print("Done")
-
-    # 8. Print node information
-    print("\n8. Print node information")
-    print_node_information(nodes)
-
-    # 9. Print node tree structure
-    print("\n9. Print node tree structure")
-    print_node_structure(nodes)
-
-    # 10. Build edges
-    print("\n10. Build edges")
-    edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names, edges_without_duplicated_with_blocked_links = process_edges(results)
-    print("Done")
-
-    # 11. Print edge information
-    print("\n11. Print edge information")
-    print_edge_information(edges, edges_with_names, switches, edges_without_duplicated, edges_without_duplicated_with_names)
-
-    # 12. Identify edges where exist blocked interfaces (Role = Alternate)
-    print("\n12. Identify edges where exist blocked interfaces (Role = Alternate)")
-    edges_to_be_deleted = identify_blocked_links(results)
-    print("Edges identified:", edges_to_be_deleted)
-
-    # 13. Remove edge(s)
-    print("\n13. Remove edge(s)")
-    edges_without_duplicated, edges_finally_deleted = remove_blocked_links(edges_to_be_deleted, edges_without_duplicated)
-    
-    # 14. Print updated edge information
-    print("\n14. Print updated edge information")
-    print_updated_edge_information(edges_without_duplicated)
-
-    # 15. Select specific data to be sent
-    print("\n15. Select specific data to be sent")
-    filtered_results = select_specific_data(results)
-    #print(filtered_results)
-    print("Done")
-
-    # 16. Set options to blocked edges
-    print("\n16. Set options to blocked edges")
-    edges_with_options = set_options_to_blocked_edges(edges_finally_deleted, edges_without_duplicated_with_blocked_links)
-    print("Done")
-
-    # 17. Print edges with options
-    print("\n17. Print edges with options")
-    print_edges_with_options(edges_with_options)
-
-    # 18. Find blocked interfaces
-    print("\n18. Find blocked interfaces")
-    blocked_interfaces = find_blocked_interfaces(results)
-    print(blocked_interfaces)
+    # 6 to 19. Build nodes and edges. When an IncrementalTopology is given, steps that do not
+    # depend on the devices that changed since the previous sweep are skipped (graph/incremental.py)
+    if topology is not None:
+        with get_metrics().stage.time(stage="incremental_update"):
+            data = topology.update(results)
+    else:
+        data = build_topology(results)
 
-    # 19. Print final data
-    print("\n19. Print final data\n") 
-    data = {
-        "nodes": nodes,
-        "edges": edges_without_duplicated,
-        "edges_with_blocked_links": edges_with_options,
-        "blocked_interfaces": blocked_interfaces,
-        "results": filtered_results,
-        "error": False,
-        "error_description": ""
-    }
-    print(data)
+    if data.get("error"):
+        return data
 
     # 20. Save final data
-    print("\n20. Save final data")
-    save_data(data)
-    print("Done")
+    logger.debug("20. Save final data")
+    if replay_path is not None:
+        logger.info("Replayed topology, not saved")
+    else:
+        # File locks, fsyncs and SQLite writes: in a worker thread, so the event loop keeps
+        # answering the other requests (/metrics, /stp-graph/stream, ...) in the meantime
+        with get_metrics().stage.time(stage="save_data"):
+            await asyncio.to_thread(save_data, data)
 
     return data
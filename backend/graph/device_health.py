@@ -0,0 +1,171 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from graph.logger import get_logger
+
+logger = get_logger("device_health")
+
+# Netmiko's own defaults: adaptive timeouts are only ever shorter than these
+NETMIKO_DEFAULT_TIMEOUTS = {"conn_timeout": 10.0, "banner_timeout": 15.0}
+# Latencies timed before the timeouts of a device start adapting
+MINIMUM_SAMPLES = 5
+# Stages of result["timings"] that measure how fast a device answers: a new session is rare
+# with the session pool, so the commands sent on pooled sessions are timed as well
+LATENCY_STAGES = ("connect", "send_command")
+# Failures that say nothing about whether the device answers: wrong credentials are not
+# fixed by waiting, and skipping the device would only hide them
+IGNORED_FAILURES = ("authentication_failure",)
+
+
+class DeviceHealth:
+    # What the tracker remembers about a device between sweeps
+    def __init__(self, window: int) -> None:
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.consecutive_failures: int = 0
+        # Circuit breaker: while open, sweeps skip the device until retry_at, when it is probed
+        self.open: bool = False
+        self.retry_at: float = 0.0
+        self.failed_probes: int = 0
+        self.probing: bool = False
+
+
+class DeviceHealthTracker:
+    """
+    Per-device connection outcomes, keyed like the session pool by (host, port)
+
+    - Adaptive timeouts: Netmiko's conn_timeout and banner_timeout become the p99 of the last
+      latencies of the device (connects and commands, see LATENCY_STAGES) times
+      timeout_multiplier (within min_timeout and Netmiko's defaults), so a switch that stopped
+      answering is given up on sooner
+    - Circuit breaker: after failure_threshold failed collections in a row (authentication
+      failures aside, see IGNORED_FAILURES) the device is skipped
+      by the sweeps and probed in the background instead, after backoff seconds, then twice as
+      long after each failed probe (up to max_backoff). A successful probe closes the circuit
+    """
+
+    def __init__(self, failure_threshold: int = 3, backoff: float = 30.0, max_backoff: float = 900.0, timeout_multiplier: float = 3.0, min_timeout: float = 2.0, window: int = 50, probe_workers: int = 4) -> None:
+        self.failure_threshold = failure_threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.window = window
+        self.probe_workers = probe_workers
+        self._lock = threading.Lock()
+        self._devices: Dict[Tuple[str, int], DeviceHealth] = {}
+        self._probe_executor: Optional[ThreadPoolExecutor] = None
+
+    def _get(self, key: Tuple[str, int]) -> DeviceHealth:
+        # Called with the lock held
+        if key not in self._devices:
+            self._devices[key] = DeviceHealth(self.window)
+        return self._devices[key]
+
+    def get_timeouts(self, key: Tuple[str, int]) -> Dict[str, float]:
+        # Empty until MINIMUM_SAMPLES latencies of the device have been timed
+        if self.timeout_multiplier <= 0:
+            return {}
+        with self._lock:
+            health = self._devices.get(key)
+            samples = sorted(health.latencies) if health is not None else []
+        if len(samples) < MINIMUM_SAMPLES:
+            return {}
+
+        p99 = samples[max(0, math.ceil(0.99 * len(samples)) - 1)]
+        timeout = max(self.min_timeout, p99 * self.timeout_multiplier)
+        return {name: min(timeout, default) for name, default in NETMIKO_DEFAULT_TIMEOUTS.items()}
+
+    def is_open(self, key: Tuple[str, int]) -> bool:
+        if self.failure_threshold <= 0:
+            return False
+        with self._lock:
+            health = self._devices.get(key)
+            return health is not None and health.open
+
+    def record(self, key: Tuple[str, int], result: Dict[str, Any]) -> None:
+        # Called with the result of capture_device_output
+        status = result.get("status", "")
+        with self._lock:
+            health = self._get(key)
+            if status.split(":")[0] in IGNORED_FAILURES:
+                return
+            if status != "success":
+                health.consecutive_failures += 1
+                if not health.open and 0 < self.failure_threshold <= health.consecutive_failures:
+                    health.open = True
+                    health.retry_at = time.time() + self.backoff
+                    logger.warning("%s:%s failed %d times in a row (%s), skipped until it answers again", *key, health.consecutive_failures, status)
+                return
+
+            for stage, _, seconds in result.get("timings") or []:
+                if stage in LATENCY_STAGES:
+                    health.latencies.append(seconds)
+            if health.open:
+                logger.info("%s:%s answers again", *key)
+            health.consecutive_failures = 0
+            health.open = False
+            health.failed_probes = 0
+
+    def probe_if_due(self, key: Tuple[str, int], probe: Callable[[], Dict[str, Any]]) -> None:
+        # probe() collects the device like a sweep would. It runs in a background thread, so
+        # the sweep that skipped the device does not wait for it
+        with self._lock:
+            health = self._devices.get(key)
+            if health is None or not health.open or health.probing or time.time() < health.retry_at:
+                return
+            health.probing = True
+            if self._probe_executor is None:
+                self._probe_executor = ThreadPoolExecutor(max_workers=self.probe_workers, thread_name_prefix="device-probe")
+            executor = self._probe_executor
+
+        def run() -> None:
+            try:
+                result = probe()
+            except Exception as e:
+                result = {"status": f"other_failure:{str(e)}"}
+            self.record(key, result)
+            with self._lock:
+                health.probing = False
+                if health.open:
+                    health.failed_probes += 1
+                    health.retry_at = time.time() + min(self.backoff * 2 ** health.failed_probes, self.max_backoff)
+
+        executor.submit(run)
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._probe_executor = self._probe_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "open_circuits": sum(health.open for health in self._devices.values()),
+                "probing": sum(health.probing for health in self._devices.values()),
+            }
+
+
+_device_health: Optional[DeviceHealthTracker] = None
+_device_health_lock = threading.Lock()
+
+
+def get_device_health() -> DeviceHealthTracker:
+    global _device_health
+
+    with _device_health_lock:
+        if _device_health is None:
+            _device_health = DeviceHealthTracker(
+                failure_threshold=int(os.getenv("STP_CIRCUIT_FAILURES", 3)),
+                backoff=float(os.getenv("STP_CIRCUIT_BACKOFF", 30)),
+                max_backoff=float(os.getenv("STP_CIRCUIT_MAX_BACKOFF", 900)),
+                timeout_multiplier=float(os.getenv("STP_TIMEOUT_MULTIPLIER", 3)),
+                min_timeout=float(os.getenv("STP_MIN_CONNECT_TIMEOUT", 2)),
+            )
+        return _device_health
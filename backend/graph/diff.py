@@ -0,0 +1,123 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from graph.code import vlan_number
+
+# Attributes of a node compared between two topologies
+NODE_FIELDS = ("level", "priority", "mac_address")
+
+
+def get_root_bridge(topology: Dict[str, Any]) -> Optional[str]:
+    # Per-VLAN trees carry their root bridge, the main topology has it as the node at level 0
+    if topology.get("root_bridge"):
+        return topology.get("root_bridge")
+    return next((node.get("label") for node in topology.get("nodes") or [] if node.get("level") == 0), None)
+
+
+def get_nodes_by_label(topology: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # Node ids are the positions of the devices in device_credentials.json, so adding, removing or
+    # reordering a device renumbers the others between two snapshots. Labels (hostnames) do not change
+    return {node.get("label"): node for node in topology.get("nodes") or []}
+
+
+def get_link_keys(edges: List[Dict[str, Any]], label_by_id: Dict[Any, str]) -> Set[Tuple[str, str]]:
+    return {
+        tuple(sorted((label_by_id.get(edge.get("from"), str(edge.get("from"))), label_by_id.get(edge.get("to"), str(edge.get("to"))))))
+        for edge in edges
+    }
+
+
+def get_alternate_ports(blocked_interfaces: List[Dict[str, Dict[str, List[str]]]]) -> Set[Tuple[str, str]]:
+    return {
+        (device, interface)
+        for entry in blocked_interfaces or []
+        for device, value in entry.items()
+        for interface in value.get("interfaces") or []
+    }
+
+
+def diff_topology(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    # Root bridge, nodes, links and Alternate ports added, removed or changed between two topologies.
+    # Everything is compared through sets and dicts keyed by label, so it is linear in their size
+    old_nodes = get_nodes_by_label(old)
+    new_nodes = get_nodes_by_label(new)
+    old_labels = {node.get("id"): label for label, node in old_nodes.items()}
+    new_labels = {node.get("id"): label for label, node in new_nodes.items()}
+
+    # 1. Root bridge
+    old_root = get_root_bridge(old)
+    new_root = get_root_bridge(new)
+
+    # 2. Nodes
+    changed_nodes = []
+    for label in sorted(old_nodes.keys() & new_nodes.keys(), key=str):
+        changes = {
+            field: {"old": old_nodes[label].get(field), "new": new_nodes[label].get(field)}
+            for field in NODE_FIELDS
+            if old_nodes[label].get(field) != new_nodes[label].get(field)
+        }
+        if changes:
+            changed_nodes.append({"label": label, "changes": changes})
+
+    # 3. Links (edges_with_blocked_links has every link, edges only the forwarding ones)
+    old_links = get_link_keys(old.get("edges_with_blocked_links") or old.get("edges") or [], old_labels)
+    new_links = get_link_keys(new.get("edges_with_blocked_links") or new.get("edges") or [], new_labels)
+    old_blocked = old_links - get_link_keys(old.get("edges") or [], old_labels)
+    new_blocked = new_links - get_link_keys(new.get("edges") or [], new_labels)
+    kept_links = old_links & new_links
+
+    # 4. Ports whose role changed from or to Alternate
+    old_ports = get_alternate_ports(old.get("blocked_interfaces"))
+    new_ports = get_alternate_ports(new.get("blocked_interfaces"))
+
+    def links(keys: Set[Tuple[str, str]]) -> List[Dict[str, str]]:
+        return [{"from": a, "to": b} for a, b in sorted(keys)]
+
+    def ports(keys: Set[Tuple[str, str]]) -> List[Dict[str, str]]:
+        return [{"device": device, "interface": interface} for device, interface in sorted(keys)]
+
+    return {
+        "root_bridge": {"old": old_root, "new": new_root, "changed": old_root != new_root},
+        "nodes": {
+            "added": sorted(new_nodes.keys() - old_nodes.keys(), key=str),
+            "removed": sorted(old_nodes.keys() - new_nodes.keys(), key=str),
+            "changed": changed_nodes,
+        },
+        "links": {
+            "added": links(new_links - old_links),
+            "removed": links(old_links - new_links),
+            "blocked": links((new_blocked - old_blocked) & kept_links),
+            "unblocked": links((old_blocked - new_blocked) & kept_links),
+        },
+        "ports": {
+            "became_alternate": ports(new_ports - old_ports),
+            "no_longer_alternate": ports(old_ports - new_ports),
+        },
+    }
+
+
+def has_changes(diff: Dict[str, Any]) -> bool:
+    return diff["root_bridge"]["changed"] or any(
+        items for group in ("nodes", "links", "ports") for items in diff[group].values()
+    )
+
+
+def diff_topologies(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    # Diff of the whole topology plus the per-VLAN trees (only the VLANs that changed). Snapshots
+    # saved before the per-VLAN trees existed have no "vlans", so those are only compared when both have them
+    diff = diff_topology(old, new)
+
+    old_vlans = old.get("vlans")
+    new_vlans = new.get("vlans")
+    if old_vlans is not None and new_vlans is not None:
+        vlan_diffs = {
+            vlan_id: diff_topology(old_vlans[vlan_id], new_vlans[vlan_id])
+            for vlan_id in sorted(new_vlans.keys() & old_vlans.keys(), key=vlan_number)
+        }
+        diff["vlans"] = {
+            "added": sorted(new_vlans.keys() - old_vlans.keys(), key=vlan_number),
+            "removed": sorted(old_vlans.keys() - new_vlans.keys(), key=vlan_number),
+            "changed": {vlan_id: vlan_diff for vlan_id, vlan_diff in vlan_diffs.items() if has_changes(vlan_diff)},
+        }
+
+    diff["changed"] = has_changes(diff) or bool(diff.get("vlans") and any(diff["vlans"].values()))
+    return diff
@@ -0,0 +1,242 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    topology_hash TEXT NOT NULL,
+    root_bridge TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_timestamp ON snapshots (timestamp);
+
+CREATE TABLE IF NOT EXISTS nodes (
+    topology_hash TEXT NOT NULL,
+    label TEXT NOT NULL,
+    node_id INTEGER,
+    level INTEGER,
+    priority TEXT,
+    mac_address TEXT,
+    PRIMARY KEY (topology_hash, label)
+);
+CREATE INDEX IF NOT EXISTS nodes_label ON nodes (label, topology_hash);
+
+CREATE TABLE IF NOT EXISTS edges (
+    topology_hash TEXT NOT NULL,
+    from_label TEXT NOT NULL,
+    to_label TEXT NOT NULL,
+    title TEXT,
+    blocked INTEGER NOT NULL,
+    PRIMARY KEY (topology_hash, from_label, to_label)
+);
+CREATE INDEX IF NOT EXISTS edges_from_label ON edges (from_label, topology_hash);
+CREATE INDEX IF NOT EXISTS edges_to_label ON edges (to_label, topology_hash);
+
+CREATE TABLE IF NOT EXISTS blocked_interfaces (
+    topology_hash TEXT NOT NULL,
+    device TEXT NOT NULL,
+    interface TEXT NOT NULL,
+    PRIMARY KEY (topology_hash, device, interface)
+);
+CREATE INDEX IF NOT EXISTS blocked_interfaces_device ON blocked_interfaces (device, interface, topology_hash);
+"""
+
+
+def get_since(hours: float) -> str:
+    # Same format as the snapshot timestamps
+    return (datetime.now() - timedelta(hours=hours)).isoformat(timespec="seconds")
+
+
+def group_periods(rows: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    # Consecutive snapshots with the same value of key -> one period with its first and last snapshot
+    periods: List[Dict[str, Any]] = []
+    for row in rows:
+        if periods and periods[-1][key] == row[key]:
+            periods[-1]["until"] = row["timestamp"]
+            periods[-1]["until_snapshot"] = row["id"]
+            periods[-1]["snapshots"] += 1
+        else:
+            periods.append({
+                key: row[key],
+                "since": row["timestamp"],
+                "until": row["timestamp"],
+                "since_snapshot": row["id"],
+                "until_snapshot": row["id"],
+                "snapshots": 1,
+            })
+    return periods
+
+
+class HistoryDB:
+    """
+    SQLite database (WAL mode) with the history of the saved topologies
+
+    - snapshots: one row per saved topology (id, timestamp, root bridge), indexed by time
+    - nodes, edges, blocked_interfaces: rows of each different topology, keyed by its hash
+      (the same one as the snapshot store), so polls that find the same topology only add a
+      snapshot row. Indexed by device, so the history of a device is an index lookup per snapshot
+    """
+
+    def __init__(self, path: str, retention_days: float = 0, prune_every: int = 100) -> None:
+        self.path = path
+        self.retention_days = retention_days
+        self.prune_every = prune_every
+        self._local = threading.local()
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        # One connection per thread. Each block is a transaction (committed or rolled back)
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # Readers do not block the writer (and the other way around), across processes too
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        with connection:
+            yield connection
+
+    def record(self, record: Dict[str, Any], data: Dict[str, Any]) -> None:
+        # record: index record returned by the snapshot store ({"id", "timestamp", "hash"})
+        topology_hash = record.get("hash")
+        nodes = data.get("nodes") or []
+        label_by_id = {node.get("id"): node.get("label") for node in nodes}
+        root_bridge = next((node.get("label") for node in nodes if node.get("level") == 0), None)
+
+        if self.retention_days > 0 and self.prune_every > 0 and record.get("id", 1) % self.prune_every == 0:
+            self.prune(self.retention_days)
+
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO snapshots (id, timestamp, topology_hash, root_bridge) VALUES (?, ?, ?, ?)",
+                (record.get("id"), record.get("timestamp"), topology_hash, root_bridge),
+            )
+
+            already_recorded = connection.execute(
+                "SELECT 1 FROM nodes WHERE topology_hash = ? LIMIT 1", (topology_hash,)
+            ).fetchone()
+            if already_recorded:
+                return
+
+            connection.executemany(
+                "INSERT OR IGNORE INTO nodes (topology_hash, label, node_id, level, priority, mac_address) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (topology_hash, node.get("label"), node.get("id"), node.get("level"), node.get("priority"), node.get("mac_address"))
+                    for node in nodes
+                ],
+            )
+
+            active_edges = {(edge.get("from"), edge.get("to")) for edge in data.get("edges") or []}
+            connection.executemany(
+                "INSERT OR IGNORE INTO edges (topology_hash, from_label, to_label, title, blocked) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        topology_hash,
+                        label_by_id.get(edge.get("from"), str(edge.get("from"))),
+                        label_by_id.get(edge.get("to"), str(edge.get("to"))),
+                        edge.get("title"),
+                        int((edge.get("from"), edge.get("to")) not in active_edges),
+                    )
+                    for edge in data.get("edges_with_blocked_links") or []
+                ],
+            )
+
+            connection.executemany(
+                "INSERT OR IGNORE INTO blocked_interfaces (topology_hash, device, interface) VALUES (?, ?, ?)",
+                [
+                    (topology_hash, device, interface)
+                    for entry in data.get("blocked_interfaces") or []
+                    for device, value in entry.items()
+                    for interface in value.get("interfaces") or []
+                ],
+            )
+
+    def prune(self, retention_days: float) -> int:
+        # Deletes the snapshots older than retention_days and the topologies no longer referenced
+        oldest = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec="seconds")
+        with self.connect() as connection:
+            deleted = connection.execute("DELETE FROM snapshots WHERE timestamp < ?", (oldest,)).rowcount
+            for table in ("nodes", "edges", "blocked_interfaces"):
+                connection.execute(
+                    f"DELETE FROM {table} WHERE topology_hash NOT IN (SELECT topology_hash FROM snapshots)"
+                )
+        return deleted
+
+    def get_snapshots(self, hours: float) -> List[Dict[str, Any]]:
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT id, timestamp, topology_hash, root_bridge FROM snapshots WHERE timestamp >= ? ORDER BY id",
+                (get_since(hours),),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_root_bridge_history(self, hours: float) -> List[Dict[str, Any]]:
+        # Root bridge of each period in which it did not change
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT id, timestamp, root_bridge FROM snapshots WHERE timestamp >= ? ORDER BY id",
+                (get_since(hours),),
+            ).fetchall()
+        return group_periods([dict(row) for row in rows], "root_bridge")
+
+    def get_interface_history(self, device: str, interface: str, hours: float) -> List[Dict[str, Any]]:
+        # Periods in which an interface of a device was blocked (Alternate) or not
+        with self.connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT s.id, s.timestamp, EXISTS (
+                    SELECT 1 FROM blocked_interfaces b
+                    WHERE b.topology_hash = s.topology_hash AND b.device = ? AND b.interface = ?
+                ) AS blocked
+                FROM snapshots s
+                WHERE s.timestamp >= ?
+                ORDER BY s.id
+                """,
+                (device, interface, get_since(hours)),
+            ).fetchall()
+        periods = group_periods([{**dict(row), "blocked": bool(row["blocked"])} for row in rows], "blocked")
+        for period in periods:
+            period["role"] = "Alternate" if period["blocked"] else "not Alternate"
+        return periods
+
+    def get_device_history(self, label: str, hours: float) -> List[Dict[str, Any]]:
+        # Level, priority and MAC address of a device over time (None while it was not in the topology)
+        with self.connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT s.id, s.timestamp, n.level, n.priority, n.mac_address
+                FROM snapshots s
+                LEFT JOIN nodes n ON n.topology_hash = s.topology_hash AND n.label = ?
+                WHERE s.timestamp >= ?
+                ORDER BY s.id
+                """,
+                (label, get_since(hours)),
+            ).fetchall()
+        return group_periods(
+            [{**dict(row), "state": {"level": row["level"], "priority": row["priority"], "mac_address": row["mac_address"]}} for row in rows],
+            "state",
+        )
+
+
+_history_db: Optional[HistoryDB] = None
+_history_db_lock = threading.Lock()
+
+
+def get_history_db() -> HistoryDB:
+    global _history_db
+
+    with _history_db_lock:
+        if _history_db is None:
+            _history_db = HistoryDB(
+                path=os.getenv("STP_HISTORY_DB", "./graph/history.sqlite3"),
+                # Same retention as the snapshot store
+                retention_days=float(os.getenv("STP_SNAPSHOT_RETENTION_DAYS", 30)),
+            )
+        return _history_db
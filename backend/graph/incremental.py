@@ -0,0 +1,243 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from graph import code
+from graph.topology_index import TopologyIndex
+
+# Keys of each result that end up in the node built for that device
+NODE_KEYS = ("id", "label", "title", "priority", "mac_address")
+# Keys of each CDP entry the edges are built from. The rest change on every sweep (holdtime
+# counts down) or are not used, so they are left out of the fingerprint
+CDP_KEYS = ("neighbor", "local_interface", "neighbor_interface")
+
+
+def fingerprint(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_device_key(result: Dict[str, Any]) -> str:
+    return f'{result.get("device")}:{result.get("port")}'
+
+
+def fingerprint_device(result: Dict[str, Any]) -> Dict[str, str]:
+    # One hash per input of the pipeline, so we know which steps are affected by a change.
+    # Only what the topology is built from is hashed: uptime, CDP holdtimes and the details of
+    # an error (after "other_failure:") change from one sweep to the next
+    if result.get("status") != "success":
+        return {"status": result.get("status", "").split(":")[0]}
+
+    # What code.find_root_bridge_result looks at: a change there can move the root, so it rebuilds everything
+    is_root = [
+        sorted(vlan_id for vlan_id, vlan in (result.get("stp_vlans") or {}).items() if vlan.get("is_root")),
+        code.CISCO_STP_RAW_OUTPUT_ROOT_BRIDGE_TEXT in (result.get("stp_output_raw") or ""),
+    ]
+    return {
+        "status": "success",
+        "node": fingerprint([result.get(key) for key in NODE_KEYS] + [is_root]),
+        "cdp": fingerprint([[entry.get(key) for key in CDP_KEYS] for entry in result.get("cdp_output_parsed") or []]),
+        "stp": fingerprint([result.get("stp_output_parsed"), result.get("stp_vlans")]),
+    }
+
+
+def get_edge_key(edge: Dict[str, Any]) -> Tuple[Any, Any]:
+    return tuple(sorted((edge.get("from"), edge.get("to")), key=str))
+
+
+def find_device_edges(result: Dict[str, Any], index: TopologyIndex) -> List[Dict[str, Any]]:
+    # Edges built by code.process_edges from the CDP neighbors of a single device
+    return code.process_edges([result], index)[3]
+
+
+def merge_device_edges(results: List[Dict[str, Any]], device_edges: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Same edges, in the same order, as code.process_edges over all the results: when both ends
+    # of a link list it, the edge of the first device in results is kept
+    edges: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    for result in results:
+        for edge in device_edges.get(get_device_key(result), []):
+            edges.setdefault(get_edge_key(edge), edge)
+    return list(edges.values())
+
+
+def find_device_blocked_links(result: Dict[str, Any], index: TopologyIndex) -> Set[Tuple[Any, Any]]:
+    # Same logic as code.identify_blocked_links, for a single device
+    return {get_edge_key(edge) for edge in code.identify_blocked_links([result], index)}
+
+
+def find_device_blocked_interfaces(result: Dict[str, Any]) -> List[str]:
+    # Same logic as code.find_blocked_interfaces, for a single device
+    return [
+        entry.get("interface")
+        for entry in result.get("stp_output_parsed") or []
+        if entry.get("role") == "Alternate"
+    ]
+
+
+def compute_delta(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    # Added, removed and updated nodes/edges between two topologies, keyed by node id and edge ends
+    def compare(old_items: Dict[Any, Any], new_items: Dict[Any, Any]) -> Dict[str, List[Any]]:
+        return {
+            "added": [new_items[key] for key in new_items.keys() - old_items.keys()],
+            "removed": [old_items[key] for key in old_items.keys() - new_items.keys()],
+            "updated": [
+                new_items[key]
+                for key in new_items.keys() & old_items.keys()
+                if new_items[key] != old_items[key]
+            ],
+        }
+
+    previous = previous or {}
+    return {
+        "nodes": compare(
+            {node.get("id"): node for node in previous.get("nodes") or []},
+            {node.get("id"): node for node in current.get("nodes") or []},
+        ),
+        "edges": compare(
+            {get_edge_key(edge): edge for edge in previous.get("edges_with_blocked_links") or []},
+            {get_edge_key(edge): edge for edge in current.get("edges_with_blocked_links") or []},
+        ),
+    }
+
+
+class IncrementalTopology:
+    """
+    Keeps the topology computed in the previous sweep and the fingerprint of each device
+    (parsed STP, parsed CDP and node attributes) so the next sweep only does the work
+    needed by what changed:
+
+    - nothing changed: the previous nodes and edges are reused as they are
+    - only STP port roles and/or CDP neighbors changed: the blocked links and blocked
+      interfaces of the changed devices are patched, and so are the edges built from the CDP
+      neighbors of each device whose CDP changed. Nodes are reused, or only their levels
+      computed again after a CDP change (the per-VLAN trees are built again in a single pass)
+    - anything else (root bridge, bridge priority, devices that appear or fail): the whole
+      topology is rebuilt with code.build_topology
+
+    Each computed topology carries a "delta" with the changes against the previous one.
+    """
+
+    def __init__(self) -> None:
+        self.data: Optional[Dict[str, Any]] = None
+        self.fingerprints: Dict[str, Dict[str, str]] = {}
+        self.edges: List[Dict[str, Any]] = []
+        self.device_edges: Dict[str, List[Dict[str, Any]]] = {}
+        self.blocked_links: Dict[str, Set[Tuple[Any, Any]]] = {}
+        self.blocked_interfaces: Dict[str, List[str]] = {}
+
+    def _remember(self, results: List[Dict[str, Any]], data: Dict[str, Any], fingerprints: Dict[str, Dict[str, str]]) -> None:
+        index = TopologyIndex(results)
+
+        self.data = data
+        self.fingerprints = fingerprints
+        # Edges as built by process_edges, before set_options_to_blocked_edges styles the blocked ones
+        self.edges = [
+            {"from": edge.get("from"), "to": edge.get("to"), "title": edge.get("title")}
+            for edge in data.get("edges_with_blocked_links") or []
+        ]
+        self.device_edges = {}
+        self.blocked_links = {}
+        self.blocked_interfaces = {}
+        for result in results:
+            if result.get("status") == "success":
+                key = get_device_key(result)
+                self.device_edges[key] = find_device_edges(result, index)
+                self.blocked_links[key] = find_device_blocked_links(result, index)
+                self.blocked_interfaces[key] = find_device_blocked_interfaces(result)
+
+    def _patch(self, results: List[Dict[str, Any]], changed: List[str], cdp_changed: List[str]) -> Dict[str, Any]:
+        index = TopologyIndex(results)
+        results_by_key = {get_device_key(r): r for r in results}
+
+        # A blocked link is found through the CDP neighbor of the blocked port, so both STP and
+        # CDP changes move them
+        for key in changed:
+            self.blocked_links[key] = find_device_blocked_links(results_by_key[key], index)
+            self.blocked_interfaces[key] = find_device_blocked_interfaces(results_by_key[key])
+
+        nodes = self.data.get("nodes")
+        if cdp_changed:
+            for key in cdp_changed:
+                self.device_edges[key] = find_device_edges(results_by_key[key], index)
+            self.edges = [
+                {"from": edge.get("from"), "to": edge.get("to"), "title": edge.get("title")}
+                for edge in merge_device_edges(results, self.device_edges)
+            ]
+            # Levels are the distance to the root bridge over the CDP neighbors. The root itself
+            # cannot have moved: its STP data is part of the node fingerprint
+            nodes = code.update_node_title_with_level_info(
+                code.process_nodes(code.find_root_bridge(results), results, index)
+            )
+
+        blocked_links = set().union(*self.blocked_links.values())
+        edges = [dict(edge) for edge in self.edges if get_edge_key(edge) not in blocked_links]
+        edges_finally_deleted = [edge for edge in self.edges if get_edge_key(edge) in blocked_links]
+        edges_with_options = code.set_options_to_blocked_edges(
+            edges_finally_deleted, [dict(edge) for edge in self.edges]
+        )
+
+        prompt_by_key = {get_device_key(r): r.get("prompt") for r in results}
+        blocked_interfaces = [
+            {prompt_by_key[key]: {"interfaces": interfaces}}
+            for key, interfaces in self.blocked_interfaces.items()
+            if interfaces
+        ]
+
+        return {
+            **self.data,
+            "nodes": nodes,
+            "edges": edges,
+            "edges_with_blocked_links": edges_with_options,
+            "blocked_interfaces": blocked_interfaces,
+            # Port roles are what the per-VLAN trees are made of, so they are built again
+            "vlans": code.build_vlan_topologies(results, index),
+        }
+
+    def update(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        fingerprints = {get_device_key(result): fingerprint_device(result) for result in results}
+
+        changed = [key for key, value in fingerprints.items() if self.fingerprints.get(key) != value]
+        patchable = self.data is not None and fingerprints.keys() == self.fingerprints.keys()
+        changed_inputs = {
+            key: {name for name in fingerprints[key] if fingerprints[key][name] != self.fingerprints[key].get(name)}
+            for key in changed
+        } if patchable else {}
+        patchable = patchable and all(names <= {"stp", "cdp"} for names in changed_inputs.values())
+
+        if self.data is not None and not changed:
+            rebuild = "none"
+            data = dict(self.data)
+        elif patchable:
+            rebuild = "partial"
+            data = self._patch(results, changed, [key for key in changed if "cdp" in changed_inputs[key]])
+        else:
+            rebuild = "full"
+            data = code.build_topology(results)
+            if data.get("error"):
+                self.data = None
+                self.fingerprints = {}
+                return data
+
+        # uptime (and the rest of the details of each device) are refreshed on every sweep.
+        # Levels are taken from the nodes, which a partial rebuild may have reused
+        if rebuild != "full":
+            level_by_id = {node.get("id"): node.get("level") for node in data.get("nodes") or []}
+            for result in results:
+                if result.get("id") in level_by_id:
+                    result["level"] = level_by_id[result.get("id")]
+            data["results"] = code.select_specific_data(results)
+
+        prompt_by_key = {get_device_key(result): result.get("prompt") for result in results}
+        removed = self.fingerprints.keys() - fingerprints.keys()
+        data["delta"] = {
+            "rebuild": rebuild,
+            "changed_devices": sorted(prompt_by_key.get(key) or key for key in [*changed, *removed]),
+            **(compute_delta(self.data, data) if rebuild != "none" else compute_delta({}, {})),
+        }
+
+        if rebuild == "full":
+            self._remember(results, data, fingerprints)
+        else:
+            self.data = data
+            self.fingerprints = fingerprints
+
+        return data
@@ -0,0 +1,96 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# Every module logs under the "stp" logger: get_logger("code") -> "stp.code"
+LOGGER_NAME = "stp"
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One line per record: "time LEVEL logger message key=value ..." or, with json_lines, one JSON
+    object. The key/value pairs are the fields given with extra={"fields": {...}}
+    """
+
+    def __init__(self, json_lines: bool = False) -> None:
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields: Dict[str, Any] = getattr(record, "fields", None) or {}
+        timestamp = datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+
+        if self.json_lines:
+            return json.dumps({
+                "time": timestamp,
+                "level": record.levelname,
+                "logger": record.name,
+                "message": message,
+                **fields,
+            }, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} {record.name} {message}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+def setup_logging() -> None:
+    # The records are put in a queue by the thread that logs them and written by the listener
+    # thread, so a slow stdout/stderr never blocks the event loop or the SSH worker threads.
+    # Level: STP_LOG_LEVEL (default: INFO, DEBUG adds the full dumps of results, nodes and edges).
+    # Format: STP_LOG_FORMAT (text or json)
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        handler = logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter(json_lines=os.getenv("STP_LOG_FORMAT", "text").lower() == "json"))
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(os.getenv("STP_LOG_LEVEL", "INFO").upper())
+        logger.addHandler(QueueHandler(log_queue))
+        logger.propagate = False
+
+        _listener = QueueListener(log_queue, handler)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    # Writes the records still in the queue and stops the listener thread
+    global _listener
+
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+
+        logger = logging.getLogger(LOGGER_NAME)
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                logger.removeHandler(handler)
+        logger.propagate = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    # Until setup_logging() is called (the app does it on startup), records go to the root
+    # logger, so the helper scripts only show warnings and errors
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
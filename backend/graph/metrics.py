@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the histogram buckets, from a fast parse to a slow SSH login
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Histogram:
+    """
+    Prometheus histogram: one count per bucket (cumulative when exported), sum and count of
+    the observed values, for each combination of label values. Safe to use from any thread
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def sums(self) -> Dict[Tuple[str, ...], float]:
+        # Total of the observed values for each combination of label values
+        with self._lock:
+            return {key: values[-2] for key, values in self._series.items()}
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+
+        for key, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="' + format_bound(bound) + '"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, le)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {values[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {values[-1]:g}")
+        return lines
+
+
+class Metrics:
+    """
+    Timings of the sweeps exported in the Prometheus text format (GET /metrics):
+
+    - stp_sweep_seconds: whole sweeps (collection and graph steps, see graph/scheduler.py)
+    - stp_graph_stage_seconds{stage}: each step that builds the topology (find_root_bridge,
+      process_nodes, process_edges, identify_blocked_links, remove_blocked_links, save_data, ...)
+    - stp_device_stage_seconds{device, stage, command}: connect, enable, each command sent
+      and each parse, per device (without the device label when device_labels is False)
+
+    Values are kept in memory by the app process (a single uvicorn worker, see main.py).
+    """
+
+    def __init__(self, device_labels: bool = True) -> None:
+        self.device_labels = device_labels
+        self.sweep = Histogram("stp_sweep_seconds", "Duration of a whole topology sweep")
+        self.stage = Histogram("stp_graph_stage_seconds", "Duration of each step that builds the topology", ("stage",))
+        self.device = Histogram(
+            "stp_device_stage_seconds",
+            "Duration of connect, enable, each command and each parse of a device",
+            ("device", "stage", "command") if device_labels else ("stage", "command"),
+        )
+
+    def observe_device(self, result: Dict) -> None:
+        # Timings gathered by capture_device_output and parse_device_output in result["timings"]:
+        # [stage, command, seconds]. They are sent back from the parse worker processes with the result
+        device = result.get("prompt") or f'{result.get("device")}:{result.get("port")}'
+        for stage, command, seconds in result.get("timings") or []:
+            self.device.observe(seconds, device=device, stage=stage, command=command)
+
+    def render(self) -> str:
+        return "\n".join([*self.sweep.collect(), *self.stage.collect(), *self.device.collect()]) + "\n"
+
+
+@contextmanager
+def timed(timings: List, stage: str, command: str = "") -> Iterator[None]:
+    # Appends [stage, command, seconds] to the timings of a device (see Metrics.observe_device)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append([stage, command, time.perf_counter() - start])
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics(device_labels=os.getenv("STP_METRICS_DEVICE_LABELS", "1") != "0")
+        return _metrics
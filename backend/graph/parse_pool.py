@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from graph.templates import get_template_registry
+
+
+def init_parse_worker() -> None:
+    # Every worker process has its own template registry, so the templates are compiled
+    # once per process when it starts instead of on its first device
+    get_template_registry().preload()
+
+
+def get_mp_context() -> multiprocessing.context.BaseContext:
+    # The pool is started once the app already runs threads (event loop executors, session
+    # pool reaper, log listener), and forking a process with threads can copy a lock held by
+    # one of them and leave the worker deadlocked. The workers are started from a clean
+    # server process instead (forkserver), or as new interpreters where it is not available
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Imported once by the server process, so each worker does not import them again
+        context.set_forkserver_preload(["graph.code"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_workers() -> int:
+    # STP_PARSE_WORKERS=0 parses each device in its I/O thread, right after its outputs are captured
+    return int(os.getenv("STP_PARSE_WORKERS", os.cpu_count() or 1))
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    global _parse_pool
+
+    with _parse_pool_lock:
+        if _parse_pool is None and get_parse_workers() > 0:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=get_parse_workers(),
+                mp_context=get_mp_context(),
+                initializer=init_parse_worker,
+            )
+        return _parse_pool
+
+
+def close_parse_pool() -> None:
+    # Also used to drop a pool whose workers died, so the next sweep starts a new one
+    global _parse_pool
+
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
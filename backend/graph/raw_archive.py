@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from graph.atomic_files import write_atomically
+
+# Keys of each device needed to parse its outputs again. Credentials are never archived
+ARCHIVED_DEVICE_KEYS = ("host", "port", "device_type", "stp_template", "cdp_template", "version_template")
+
+# Keys of each result set by capture_device_output, before any parsing
+ARCHIVED_RESULT_KEYS = (
+    "device", "port", "device_type", "prompt", "status",
+    "stp_output_raw", "cdp_output_raw", "version_output_raw",
+    "version", "serial", "uptime", "version_cached",
+    "id", "label", "title", "level",
+)
+
+
+class RawArchive:
+    """
+    Raw outputs captured on each sweep (show spanning-tree, show cdp neighbors and show version
+    of every device, failures included), written to root/<day>/<time>-<pid>.jsonl.gz: a header
+    line followed by one {"device", "result"} line per device, gzip compressed.
+
+    A sweep can be replayed from its archive (code.main(replay_path=...)) to run the parse and
+    graph pipeline again without SSH. Day folders older than retention_days are removed when a
+    new archive is written.
+    """
+
+    def __init__(self, root: str, retention_days: float) -> None:
+        self.root = root
+        self.retention_days = retention_days
+
+    def write(self, entries: List[Tuple[Dict[str, Any], Dict[str, Any]]], timestamp: Optional[datetime] = None) -> str:
+        # entries: (device, captured result) of each device of the sweep, in device order
+        timestamp = timestamp or datetime.now()
+        directory = os.path.join(self.root, timestamp.strftime("%Y-%m-%d"))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{timestamp.strftime('%H-%M-%S-%f')}-{os.getpid()}.jsonl.gz")
+
+        lines = [json.dumps({"timestamp": timestamp.isoformat(timespec="seconds"), "devices": len(entries)})]
+        for device, result in entries:
+            lines.append(json.dumps({
+                "device": {key: device[key] for key in ARCHIVED_DEVICE_KEYS if key in device},
+                "result": {key: result.get(key) for key in ARCHIVED_RESULT_KEYS},
+            }, default=str))
+        write_atomically(path, gzip.compress("\n".join(lines).encode() + b"\n"))
+
+        self.prune(timestamp)
+        return path
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        if self.retention_days <= 0:
+            return 0
+        oldest = ((now or datetime.now()) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        removed = 0
+        for day in os.listdir(self.root):
+            if day < oldest and os.path.isdir(os.path.join(self.root, day)):
+                shutil.rmtree(os.path.join(self.root, day), ignore_errors=True)
+                removed += 1
+        return removed
+
+    def list(self) -> List[str]:
+        # Every archive, oldest first
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            os.path.join(self.root, day, name)
+            for day in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, day))
+            for name in os.listdir(os.path.join(self.root, day)) if name.endswith(".jsonl.gz")
+        )
+
+    @staticmethod
+    def read(path: str) -> Tuple[Dict[str, Any], List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+        # (header, [(device, captured result), ...]) of an archive
+        with gzip.open(path, "rt") as file:
+            header = json.loads(file.readline())
+            entries = []
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries.append((entry["device"], entry["result"]))
+        return header, entries
+
+
+_raw_archive: Optional[RawArchive] = None
+_raw_archive_lock = threading.Lock()
+
+
+def get_raw_archive() -> Optional[RawArchive]:
+    # None when STP_RAW_ARCHIVE=0
+    global _raw_archive
+
+    if os.getenv("STP_RAW_ARCHIVE", "1") == "0":
+        return None
+
+    with _raw_archive_lock:
+        if _raw_archive is None:
+            _raw_archive = RawArchive(
+                root=os.getenv("STP_RAW_ARCHIVE_DIR", "./graph/raw_archive"),
+                retention_days=float(os.getenv("STP_RAW_ARCHIVE_RETENTION_DAYS", 7)),
+            )
+        return _raw_archive
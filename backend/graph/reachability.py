@@ -0,0 +1,24 @@
+import asyncio
+import contextlib
+import os
+
+# Checks running at the same time, each one is a file descriptor
+MAX_CONCURRENT_CHECKS = 512
+
+
+def get_precheck_timeout() -> float:
+    # STP_TCP_PRECHECK_TIMEOUT=0 disables the pre-check
+    return float(os.getenv("STP_TCP_PRECHECK_TIMEOUT", 2))
+
+
+async def is_reachable(host: str, port: int, timeout: float) -> bool:
+    # A TCP handshake only: the connection is closed as soon as it is established
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.close()
+    with contextlib.suppress(OSError, asyncio.TimeoutError):
+        await asyncio.wait_for(writer.wait_closed(), timeout)
+    return True
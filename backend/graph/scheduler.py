@@ -0,0 +1,163 @@
+import asyncio
+import functools
+import os
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from graph import code
+from graph.incremental import IncrementalTopology
+from graph.logger import get_logger
+from graph.metrics import get_metrics
+from graph.singleflight import SingleFlight
+
+logger = get_logger("scheduler")
+
+
+class TopologySnapshot:
+    # Latest computed topology (the dictionary returned by code.main) and when it was collected
+    def __init__(self, data: Dict[str, Any], collected_at: float, elapsed_time: Dict[str, Any]) -> None:
+        self.data = data
+        self.collected_at = collected_at
+        self.elapsed_time = elapsed_time
+
+    def age(self) -> float:
+        return time.time() - self.collected_at
+
+
+class TopologyPoller:
+    """
+    Collects the topology in the background every interval seconds and keeps the last
+    snapshot in memory, so /stp-graph does not need to sweep the devices per request.
+    Concurrent refreshes share the sweep that is already running (see SingleFlight).
+    """
+
+    def __init__(self, collect: Callable[..., Awaitable[Dict[str, Any]]], interval: float) -> None:
+        self.collect = collect
+        self.interval = interval
+        self.snapshot: Optional[TopologySnapshot] = None
+        self.singleflight = SingleFlight()
+        self._polling_task: Optional[asyncio.Task] = None
+        # Devices collected so far by the sweep in progress and the queues of /stp-graph/stream clients
+        self._sweep_events: List[Dict[str, Any]] = []
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        self._sweep_events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def _on_result(self, result: Dict[str, Any]) -> None:
+        device = code.select_specific_data([result])[0]
+        device["port"] = result.get("port")
+        device["status"] = result.get("status")
+        self._publish({"event": "device", "data": device})
+
+    async def _collect(self) -> TopologySnapshot:
+        self._sweep_events = []
+        try:
+            start_total: float = time.time()
+            data = await self.collect(on_result=self._on_result)
+            end_total: float = time.time() - start_total
+            get_metrics().sweep.observe(end_total)
+            end_total, unit = code.print_execution_time(end_total)
+
+            self.snapshot = TopologySnapshot(data, time.time(), {"value": end_total, "unit": unit})
+            return self.snapshot
+        finally:
+            for queue in self._subscribers:
+                queue.put_nowait(None)
+            self._sweep_events = []
+
+    async def refresh(self) -> TopologySnapshot:
+        # Join the sweep in progress (if any) instead of starting a new one. The background
+        # polling goes through here too, so a refresh requested during a scheduled sweep shares it
+        return await self.singleflight.do("topology", self._collect)
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        # Yields a "device" event per device as soon as it has been collected, followed by the
+        # resulting snapshot. Joining a sweep in progress replays the devices already collected
+        queue: asyncio.Queue = asyncio.Queue()
+        for event in self._sweep_events:
+            queue.put_nowait(event)
+        self._subscribers.add(queue)
+
+        next_event: Optional[asyncio.Future] = None
+        try:
+            refresh_task = asyncio.ensure_future(self.refresh())
+            # The sweep is awaited along with the queue: a client joining after _collect has
+            # sent the end of the sweep (None) but before SingleFlight forgets the sweep shares
+            # it without ever receiving None
+            while True:
+                next_event = asyncio.ensure_future(queue.get())
+                await asyncio.wait({next_event, refresh_task}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_event.done():
+                    break
+                event = next_event.result()
+                if event is None:
+                    break
+                yield event
+
+            # Every event of the sweep is queued by the time it is over
+            while not queue.empty():
+                event = queue.get_nowait()
+                if event is not None:
+                    yield event
+
+            yield {"event": "snapshot", "snapshot": await refresh_task}
+        finally:
+            if next_event is not None:
+                next_event.cancel()
+            self._subscribers.discard(queue)
+
+    async def get(self, refresh: bool = False) -> TopologySnapshot:
+        if refresh or self.snapshot is None:
+            return await self.refresh()
+        return self.snapshot
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception("Background topology collection failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0 and self._polling_task is None:
+            self._polling_task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._polling_task is not None:
+            self._polling_task.cancel()
+            try:
+                await self._polling_task
+            except asyncio.CancelledError:
+                pass
+            self._polling_task = None
+
+    def describe(self) -> Dict[str, Any]:
+        if self.snapshot is None:
+            return {}
+        return {
+            "collected_at": datetime.fromtimestamp(self.snapshot.collected_at),
+            "snapshot_age": {"value": round(self.snapshot.age(), 3), "unit": "s"},
+            "poll_interval": {"value": self.interval, "unit": "s"},
+        }
+
+
+_poller: Optional[TopologyPoller] = None
+
+
+def get_poller() -> TopologyPoller:
+    global _poller
+
+    if _poller is None:
+        # STP_POLL_INTERVAL = 0 disables the background collection: the first request
+        # collects the topology and the following ones are served from the snapshot.
+        # The poller is long-lived, so each sweep only recomputes what changed since the previous one
+        _poller = TopologyPoller(
+            collect=functools.partial(code.main, topology=IncrementalTopology()),
+            interval=float(os.getenv("STP_POLL_INTERVAL", 60)),
+        )
+    return _poller
@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from netmiko import ConnectHandler
+
+from graph.metrics import timed
+
+
+class PooledSession:
+    # A Netmiko connection that has already been opened and moved to privileged EXEC mode
+    def __init__(self, key: Tuple[str, int], connection: Any) -> None:
+        self.key = key
+        self.connection = connection
+        self.prompt: str = ""
+        self.created_at: float = time.time()
+        self.last_used: float = self.created_at
+        self.uses: int = 0
+        # [stage, command, seconds] of connect and enable(), reported by the first collection (see graph/metrics.py)
+        self.open_timings: List[List[Any]] = []
+
+
+class SessionPool:
+    """
+    Long-lived Netmiko sessions keyed by (host, port)
+
+    A session is checked out for a whole device collection and returned to the pool
+    afterwards, so the SSH key exchange and enable() are only paid once per device.
+    Idle sessions are health checked before being reused, closed after idle_timeout
+    seconds and reopened whenever a collection fails on them.
+    """
+
+    def __init__(self, max_sessions_per_device: int = 1, idle_timeout: float = 300.0) -> None:
+        self.max_sessions_per_device = max_sessions_per_device
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, int], List[PooledSession]] = defaultdict(list)
+        self._slots: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+        self._reaper: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    @staticmethod
+    def get_key(netmiko_device: Dict[str, Any]) -> Tuple[str, int]:
+        return netmiko_device.get("host", ""), int(netmiko_device.get("port", 22))
+
+    def _get_slots(self, key: Tuple[str, int]) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_sessions_per_device)
+            return self._slots[key]
+
+    def _open(self, key: Tuple[str, int], netmiko_device: Dict[str, Any]) -> PooledSession:
+        timings: List[List[Any]] = []
+        with timed(timings, "connect"):
+            connection = ConnectHandler(**netmiko_device)
+        try:
+            if "secret" in netmiko_device:
+                with timed(timings, "enable"):
+                    connection.enable()  # Enter privileged EXEC mode
+        except Exception:
+            self._disconnect(connection)
+            raise
+        session = PooledSession(key, connection)
+        session.open_timings = timings
+        return session
+
+    @staticmethod
+    def _disconnect(connection: Any) -> None:
+        try:
+            connection.disconnect()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(session: PooledSession) -> bool:
+        try:
+            return bool(session.connection.is_alive())
+        except Exception:
+            return False
+
+    def _checkout(self, key: Tuple[str, int]) -> Optional[PooledSession]:
+        while True:
+            with self._lock:
+                if not self._idle[key]:
+                    return None
+                session = self._idle[key].pop()
+
+            if time.time() - session.last_used < self.idle_timeout and self._is_healthy(session):
+                return session
+
+            # Expired or dead session: drop it and try the next idle one (if any)
+            self._disconnect(session.connection)
+
+    @contextmanager
+    def session(self, netmiko_device: Dict[str, Any]) -> Iterator[PooledSession]:
+        self._start_reaper()
+        key = self.get_key(netmiko_device)
+        slots = self._get_slots(key)
+
+        slots.acquire()
+        try:
+            session = self._checkout(key) or self._open(key, netmiko_device)
+            try:
+                yield session
+            except Exception:
+                # The session may be in an unknown state, so it is not returned to the pool.
+                # Next collection for this device will reconnect
+                self._disconnect(session.connection)
+                raise
+
+            session.uses += 1
+            session.last_used = time.time()
+            with self._lock:
+                self._idle[key].append(session)
+        finally:
+            slots.release()
+
+    def has_idle(self, key: Tuple[str, int]) -> bool:
+        # Whether a session to the device is waiting in the pool and has not expired yet. It is
+        # not health checked here, the collection does it when checking the session out
+        now = time.time()
+        with self._lock:
+            return any(now - session.last_used < self.idle_timeout for session in self._idle.get(key, ()))
+
+    def evict_idle(self) -> int:
+        now = time.time()
+        expired: List[PooledSession] = []
+        with self._lock:
+            for key, sessions in self._idle.items():
+                still_idle = []
+                for session in sessions:
+                    if now - session.last_used >= self.idle_timeout:
+                        expired.append(session)
+                    else:
+                        still_idle.append(session)
+                self._idle[key] = still_idle
+
+        for session in expired:
+            self._disconnect(session.connection)
+
+        return len(expired)
+
+    def _start_reaper(self) -> None:
+        if self._reaper is not None:
+            return
+
+        with self._lock:
+            if self._reaper is not None:
+                return
+
+            def reap() -> None:
+                while not self._closed.wait(max(1.0, self.idle_timeout / 2)):
+                    self.evict_idle()
+
+            self._reaper = threading.Thread(target=reap, name="session-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def close_all(self) -> None:
+        self._closed.set()
+        with self._lock:
+            sessions = [session for sessions in self._idle.values() for session in sessions]
+            self._idle.clear()
+
+        for session in sessions:
+            self._disconnect(session.connection)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "devices": len(self._slots),
+                "idle_sessions": sum(len(sessions) for sessions in self._idle.values()),
+            }
+
+
+_session_pool: Optional[SessionPool] = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    global _session_pool
+
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SessionPool(
+                max_sessions_per_device=int(os.getenv("STP_MAX_SESSIONS_PER_DEVICE", 1)),
+                idle_timeout=float(os.getenv("STP_SESSION_IDLE_TIMEOUT", 300)),
+            )
+        return _session_pool
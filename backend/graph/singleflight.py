@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call is in
+    progress wait for it and receive its result (or its exception) instead of
+    starting their own
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._metrics: Dict[str, int] = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "failures": 0,
+        }
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+        if not task.cancelled() and task.exception() is not None:
+            self._metrics["failures"] += 1
+
+    async def do(self, key: str, function: Callable[[], Awaitable[Any]]) -> Any:
+        self._metrics["calls"] += 1
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self._metrics["executions"] += 1
+            task = asyncio.create_task(function())
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self._in_flight[key] = task
+        else:
+            self._metrics["coalesced"] += 1
+
+        # shield() keeps the call running for the other callers if this one is cancelled
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._metrics, "in_flight": len(self._in_flight)}
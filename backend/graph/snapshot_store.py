@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from graph.atomic_files import FileLock, write_atomically
+
+# Parts of the topology saved on every sweep. Each one is stored as its own object, so a sweep
+# where only the blocked links change does not store the nodes again
+SNAPSHOT_PARTS = ("nodes", "edges", "edges_with_blocked_links", "blocked_interfaces", "vlans")
+
+# Unreferenced objects newer than this (seconds) are kept by compact(): they may belong to a
+# topology being saved right now whose record is not in the index yet
+UNREFERENCED_GRACE_PERIOD = 3600
+
+
+def encode(content: Any) -> bytes:
+    # Canonical JSON: the same content always gives the same bytes, and so the same hash
+    return json.dumps(content, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+class SnapshotStore:
+    """
+    Content-addressed store for the topologies saved after each sweep (replaces the
+    graph/saved_data/<counter>-<timestamp>/ folders):
+
+    - objects/<hash[:2]>/<hash>.json: each part of a topology (nodes, edges, ...) and each
+      manifest (part name -> hash of the part) is written once, named after its SHA-256
+    - index.jsonl: one record per saved topology, {"id", "timestamp", "hash"}, where hash is
+      the hash of its manifest
+    - counter_path: next snapshot id
+
+    Snapshot ids are taken from the counter and their records appended to the index while
+    holding a lock file (index.lock), so the uvicorn workers never share an id and the index
+    stays in id order. Every file is written through a temporary file, fsync and a rename.
+
+    Saving a topology that has not changed only appends a line to the index. Every
+    compact_every saves, the index is compacted: records older than retention_days or beyond
+    the newest max_records are dropped, consecutive records with the same hash are merged into
+    one (keeping "until_id" and "until"), and objects no longer referenced are deleted.
+    """
+
+    def __init__(self, root: str, counter_path: str, retention_days: float, max_records: int, compact_every: int) -> None:
+        self.root = root
+        self.counter_path = counter_path
+        self.retention_days = retention_days
+        self.max_records = max_records
+        self.compact_every = compact_every
+        self.objects_dir = os.path.join(root, "objects")
+        self.index_path = os.path.join(root, "index.jsonl")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = FileLock(os.path.join(root, "index.lock"))
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.objects_dir, content_hash[:2], f"{content_hash}.json")
+
+    def _put(self, content: Any) -> str:
+        payload = encode(content)
+        content_hash = hashlib.sha256(payload).hexdigest()
+        path = self._object_path(content_hash)
+        if os.path.exists(path):
+            # Refreshes its mtime, so compact() does not delete it before the new record is indexed
+            os.utime(path)
+            return content_hash
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomically(path, payload)
+        return content_hash
+
+    def _get(self, content_hash: str) -> Any:
+        with open(self._object_path(content_hash), "rb") as file:
+            return json.loads(file.read())
+
+    def read_index(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, "r") as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    def _write_index(self, records: List[Dict[str, Any]]) -> None:
+        write_atomically(self.index_path, "".join(json.dumps(record) + "\n" for record in records).encode())
+
+    def _read_counter(self) -> int:
+        if not os.path.exists(self.counter_path):
+            return 1
+        with open(self.counter_path, "r") as file:
+            return int(file.read().strip() or 1)
+
+    def save(self, data: Dict[str, Any], timestamp: Optional[datetime] = None, snapshot_id: Optional[int] = None) -> Dict[str, Any]:
+        # Returns the index record of the topology. snapshot_id is only given to import old snapshots
+        manifest = {part: self._put(data.get(part)) for part in SNAPSHOT_PARTS}
+        snapshot_hash = self._put(manifest)
+
+        with self._lock:
+            # Read and update the counter
+            counter = self._read_counter()
+            if snapshot_id is None:
+                snapshot_id = counter
+            write_atomically(self.counter_path, str(max(counter, snapshot_id + 1)).encode())
+
+            record = {
+                "id": snapshot_id,
+                "timestamp": (timestamp or datetime.now()).isoformat(timespec="seconds"),
+                "hash": snapshot_hash,
+            }
+            with open(self.index_path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+        if self.compact_every > 0 and snapshot_id % self.compact_every == 0:
+            self.compact()
+
+        return record
+
+    def find(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        # Index record of a snapshot id, also when it has been merged into a previous record
+        for record in reversed(self.read_index()):
+            if record["id"] <= snapshot_id <= record.get("until_id", record["id"]):
+                return record
+        return None
+
+    def load(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        # Topology saved with snapshot_id (same keys as the data given to save), or None
+        record = self.find(snapshot_id)
+        if record is None:
+            return None
+
+        manifest = self._get(record["hash"])
+        return {
+            "id": snapshot_id,
+            "timestamp": record["timestamp"],
+            "hash": record["hash"],
+            **{part: self._get(content_hash) for part, content_hash in manifest.items()},
+        }
+
+    def compact(self) -> Dict[str, int]:
+        with self._lock:
+            # Imported snapshots may have been appended after newer ones
+            records = sorted(self.read_index(), key=lambda record: record["id"])
+            total_records = len(records)
+
+            # 1. Retention: age and number of records
+            if self.retention_days > 0:
+                oldest = (datetime.now() - timedelta(days=self.retention_days)).isoformat(timespec="seconds")
+                records = [record for record in records if record.get("until", record["timestamp"]) >= oldest]
+
+            # 2. Merge consecutive records of the same topology
+            compacted: List[Dict[str, Any]] = []
+            for record in records:
+                previous = compacted[-1] if compacted else None
+                if previous is not None and previous["hash"] == record["hash"]:
+                    previous["until_id"] = record.get("until_id", record["id"])
+                    previous["until"] = record.get("until", record["timestamp"])
+                else:
+                    compacted.append(dict(record))
+
+            if self.max_records > 0:
+                compacted = compacted[-self.max_records:]
+
+            self._write_index(compacted)
+
+            # 3. Delete the objects that are no longer referenced by any record
+            referenced = set()
+            for record in compacted:
+                referenced.add(record["hash"])
+                referenced.update(self._get(record["hash"]).values())
+
+            deleted_objects = 0
+            now = time.time()
+            for directory, _, file_names in os.walk(self.objects_dir):
+                for file_name in file_names:
+                    path = os.path.join(directory, file_name)
+                    if (
+                        file_name.endswith(".json")
+                        and file_name[:-len(".json")] not in referenced
+                        and now - os.path.getmtime(path) > UNREFERENCED_GRACE_PERIOD
+                    ):
+                        os.remove(path)
+                        deleted_objects += 1
+
+        return {"records": len(compacted), "removed_records": total_records - len(compacted), "deleted_objects": deleted_objects}
+
+
+_snapshot_store: Optional[SnapshotStore] = None
+_snapshot_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    global _snapshot_store
+
+    with _snapshot_store_lock:
+        if _snapshot_store is None:
+            _snapshot_store = SnapshotStore(
+                root=os.getenv("STP_SNAPSHOT_DIR", "./graph/snapshots"),
+                counter_path="./graph/counter.txt",
+                retention_days=float(os.getenv("STP_SNAPSHOT_RETENTION_DAYS", 30)),
+                max_records=int(os.getenv("STP_SNAPSHOT_MAX_RECORDS", 10000)),
+                compact_every=int(os.getenv("STP_SNAPSHOT_COMPACT_EVERY", 100)),
+            )
+        return _snapshot_store
@@ -0,0 +1,161 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Same rules as my_own_ntc_templates/modified/cisco_ios_show_spanning-tree.textfsm
+VLAN_PATTERN = re.compile(r"VLAN(0*)?(\d+)")
+PROTOCOL_PATTERN = re.compile(r"\s*Spanning tree enabled protocol (\w+)")
+INTERFACE_PATTERN = re.compile(r"(\S+)\s+(\w+)\s+(\w+)\s+(\d+)\s+(\w+).(\w+)\s+(.*)")
+
+# Lines of the Root ID and Bridge ID sections
+PRIORITY_PATTERN = re.compile(r"Priority\s+(\d+)")
+ADDRESS_PATTERN = re.compile(r"Address\s+([0-9a-fA-F.]+)")
+COST_PATTERN = re.compile(r"Cost\s+(\d+)")
+PORT_PATTERN = re.compile(r"Port\s+(\d+)(?:\s+\((\S+)\))?")
+TIMERS_PATTERN = re.compile(r"Hello Time\s+(\d+).*Max Age\s+(\d+).*Forward Delay\s+(\d+)")
+AGING_TIME_PATTERN = re.compile(r"Aging Time\s+(\d+)")
+
+ROOT_BRIDGE_TEXT = "This bridge is the root"
+
+
+def parse_id_line(line: str, section: Dict[str, Any]) -> None:
+    # line has already been stripped and has no "Root ID"/"Bridge ID" prefix
+    if line.startswith("Priority"):
+        match = PRIORITY_PATTERN.match(line)
+        if match:
+            section["priority"] = match.group(1)
+    elif line.startswith("Address"):
+        match = ADDRESS_PATTERN.match(line)
+        if match:
+            section["address"] = match.group(1)
+    elif line.startswith("Cost"):
+        match = COST_PATTERN.match(line)
+        if match:
+            section["cost"] = match.group(1)
+    elif line.startswith("Port"):
+        match = PORT_PATTERN.match(line)
+        if match:
+            section["port"] = match.group(1)
+            section["port_name"] = match.group(2) or ""
+    elif line.startswith("Hello Time"):
+        match = TIMERS_PATTERN.match(line)
+        if match:
+            section["hello_time"], section["max_age"], section["forward_delay"] = match.groups()
+    elif line.startswith("Aging Time"):
+        match = AGING_TIME_PATTERN.match(line)
+        if match:
+            section["aging_time"] = match.group(1)
+
+
+def parse_stp_output(stp_output_raw: str) -> Dict[str, Any]:
+    """
+    Parses the output of show spanning-tree (Cisco IOS, PVST+/RPVST) in a single pass:
+
+    - interfaces: one record per interface and VLAN, with the same keys and values as the
+      cisco_ios_show_spanning-tree TextFSM template
+    - vlans: vlan id -> protocol, root flag and the Root ID and Bridge ID sections (priority,
+      address, cost, port and timers)
+    - bridge_id: the first Bridge ID section found in the output
+    """
+    interfaces: List[Dict[str, str]] = []
+    vlans: Dict[str, Dict[str, Any]] = {}
+    bridge_id: Optional[Dict[str, str]] = None
+
+    vlan_id = ""
+    protocol_name = ""
+    current_vlan: Optional[Dict[str, Any]] = None
+    section: Optional[Dict[str, Any]] = None
+
+    for line in stp_output_raw.splitlines():
+        # Rules of the TextFSM template, in the same order
+        if line.startswith("VLAN"):
+            match = VLAN_PATTERN.match(line)
+            if match:
+                vlan_id = match.group(2)
+                current_vlan = vlans.setdefault(vlan_id, {
+                    "vlan_id": vlan_id,
+                    "protocol": "",
+                    "is_root": False,
+                    "root_id": {},
+                    "bridge_id": {},
+                })
+                section = None
+                continue
+
+        stripped_line = line.strip()
+        if not stripped_line:
+            # A blank line closes the Root ID / Bridge ID section
+            section = None
+            continue
+
+        if stripped_line.startswith("Spanning tree enabled protocol"):
+            match = PROTOCOL_PATTERN.match(line)
+            if match:
+                protocol_name = match.group(1)
+                if current_vlan is not None:
+                    current_vlan["protocol"] = protocol_name
+                continue
+
+        # Interface rows are the only lines that do not start with a space
+        if not line[0].isspace():
+            match = INTERFACE_PATTERN.match(line)
+            if match:
+                interface, role, status, cost, port_priority, port_id, port_type = match.groups()
+                interfaces.append({
+                    "vlan_id": vlan_id,
+                    "protocol_name": protocol_name,
+                    "interface": interface,
+                    "role": role,
+                    "status": status,
+                    "cost": cost,
+                    "port_priority": port_priority,
+                    "port_id": port_id,
+                    "type": port_type,
+                })
+                continue
+
+        # Root ID and Bridge ID sections
+        if stripped_line.startswith("Root ID"):
+            section = current_vlan["root_id"] if current_vlan is not None else {}
+            stripped_line = stripped_line[len("Root ID"):].lstrip()
+        elif stripped_line.startswith("Bridge ID"):
+            section = current_vlan["bridge_id"] if current_vlan is not None else {}
+            if bridge_id is None:
+                bridge_id = section
+            stripped_line = stripped_line[len("Bridge ID"):].lstrip()
+        elif stripped_line.startswith(ROOT_BRIDGE_TEXT):
+            if current_vlan is not None:
+                current_vlan["is_root"] = True
+            continue
+
+        if section is not None:
+            parse_id_line(stripped_line, section)
+
+    return {
+        "interfaces": interfaces,
+        "vlans": vlans,
+        "bridge_id": bridge_id or {},
+    }
+
+
+def get_bridge_id(parsed_stp: Dict[str, Any]) -> Tuple[str, str]:
+    # Priority and MAC address of the node (first Bridge ID section of the output)
+    bridge_id = parsed_stp.get("bridge_id") or {}
+    if "priority" not in bridge_id or "address" not in bridge_id:
+        raise ValueError("Bridge ID has not been found in the STP output")
+    return bridge_id["priority"], bridge_id["address"]
+
+
+def get_bridge_ids_per_vlan(parsed_stp: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # Priority, MAC address and root bridge flag of each VLAN, as used by build_vlan_topologies,
+    # along with the protocol and the Root ID and Bridge ID sections (timers included)
+    return {
+        vlan_id: {
+            "priority": vlan.get("bridge_id").get("priority", ""),
+            "mac_address": vlan.get("bridge_id").get("address", ""),
+            "is_root": vlan.get("is_root"),
+            "protocol": vlan.get("protocol"),
+            "root_id": vlan.get("root_id"),
+            "bridge_id": vlan.get("bridge_id"),
+        }
+        for vlan_id, vlan in (parsed_stp.get("vlans") or {}).items()
+    }
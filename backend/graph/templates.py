@@ -0,0 +1,94 @@
+import io
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import textfsm
+
+TEMPLATES_DIR = "my_own_ntc_templates/modified"
+
+
+class TemplateRegistry:
+    """
+    Process-wide cache of the TextFSM templates in TEMPLATES_DIR
+
+    Each template file is read once. Compiled parsers are kept in a pool per template and
+    reused (after Reset()) instead of compiling the template again for every device and
+    command, as netmiko's get_structured_data does when it is given a template file.
+    A parser is only used by one thread at a time, so the pool grows up to the number of
+    devices parsed concurrently.
+    """
+
+    def __init__(self, templates_dir: str = TEMPLATES_DIR) -> None:
+        self.templates_dir = templates_dir
+        self._lock = threading.Lock()
+        self._sources: Dict[str, str] = {}
+        self._idle_parsers: Dict[str, List[textfsm.TextFSM]] = defaultdict(list)
+        self._compiled: Dict[str, int] = defaultdict(int)
+
+    def _get_source(self, template_name: str) -> str:
+        with self._lock:
+            source = self._sources.get(template_name)
+        if source is not None:
+            return source
+
+        with open(os.path.join(self.templates_dir, template_name), "r") as file:
+            source = file.read()
+        with self._lock:
+            return self._sources.setdefault(template_name, source)
+
+    def _acquire(self, template_name: str) -> textfsm.TextFSM:
+        with self._lock:
+            if self._idle_parsers[template_name]:
+                return self._idle_parsers[template_name].pop()
+
+        parser = textfsm.TextFSM(io.StringIO(self._get_source(template_name)))
+        with self._lock:
+            self._compiled[template_name] += 1
+        return parser
+
+    def _release(self, template_name: str, parser: textfsm.TextFSM) -> None:
+        with self._lock:
+            self._idle_parsers[template_name].append(parser)
+
+    def preload(self) -> None:
+        # Compile one parser per template found in templates_dir, e.g. when the app starts
+        for template_name in sorted(os.listdir(self.templates_dir)):
+            if template_name.endswith(".textfsm"):
+                self._release(template_name, self._acquire(template_name))
+
+    def parse(self, template_name: str, raw_output: str) -> List[Dict[str, Any]]:
+        # Same output as netmiko's get_structured_data: one dictionary per record, with lowercase keys.
+        # An output without records returns an empty list instead of the raw output
+        parser = self._acquire(template_name)
+        parser.Reset()
+        # If parsing fails, the parser is not returned to the pool since its state is unknown
+        records = parser.ParseText(raw_output)
+        header = [name.lower() for name in parser.header]
+        self._release(template_name, parser)
+
+        return [dict(zip(header, record)) for record in records]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                template_name: {
+                    "compiled": self._compiled[template_name],
+                    "idle": len(self._idle_parsers[template_name]),
+                }
+                for template_name in self._sources
+            }
+
+
+_template_registry: Optional[TemplateRegistry] = None
+_template_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    global _template_registry
+
+    with _template_registry_lock:
+        if _template_registry is None:
+            _template_registry = TemplateRegistry()
+        return _template_registry
@@ -0,0 +1,45 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class TopologyIndex:
+    """
+    Hash indexes over the results of a sweep, built once in O(devices + CDP entries):
+
+    - by_prompt: prompt -> result
+    - by_label: label -> result
+    - neighbor_by_interface: (prompt, local_interface) -> CDP entry
+    - neighbors: prompt -> neighbor prompts (CDP adjacency)
+
+    When a key appears more than once, the first one wins, as the next(...) scans
+    over the results used to do
+    """
+
+    def __init__(self, results: List[Dict[str, Any]]) -> None:
+        self.results = results
+        self.by_prompt: Dict[str, Dict[str, Any]] = {}
+        self.by_label: Dict[str, Dict[str, Any]] = {}
+        self.neighbor_by_interface: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.neighbors: Dict[str, List[str]] = {}
+
+        for result in results:
+            prompt = result.get("prompt")
+            self.by_prompt.setdefault(prompt, result)
+            self.by_label.setdefault(result.get("label"), result)
+
+            neighbors = self.neighbors.setdefault(prompt, [])
+            for entry in result.get("cdp_output_parsed") or []:
+                self.neighbor_by_interface.setdefault((prompt, entry.get("local_interface")), entry)
+                neighbors.append(entry.get("neighbor"))
+
+    def get_id(self, prompt: str) -> Optional[Any]:
+        result = self.by_prompt.get(prompt)
+        if result is None:
+            return None
+        return result.get("id")
+
+    def find_neighbor(self, prompt: str, local_interface: str) -> Optional[Dict[str, Any]]:
+        # Result of the device connected to local_interface of prompt (according to CDP)
+        entry = self.neighbor_by_interface.get((prompt, local_interface))
+        if entry is None:
+            return None
+        return self.by_prompt.get(entry.get("neighbor"))
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from graph.logger import get_logger
+from graph.atomic_files import write_atomically
+
+logger = get_logger("version_cache")
+
+UPTIME_UNITS = {
+    "year": 365 * 24 * 3600,
+    "week": 7 * 24 * 3600,
+    "day": 24 * 3600,
+    "hour": 3600,
+    "minute": 60,
+}
+UPTIME_PATTERN = re.compile(r"(\d+)\s+(year|week|day|hour|minute)s?")
+
+# Uptime is only shown in minutes, so a smaller uptime than expected by this margin means a reload
+RELOAD_TOLERANCE = 120
+
+
+def uptime_to_seconds(uptime: str) -> Optional[int]:
+    # "1 week, 2 days, 3 hours, 4 minutes" -> seconds
+    matches = UPTIME_PATTERN.findall(uptime or "")
+    if not matches:
+        return None
+    return sum(int(value) * UPTIME_UNITS[unit] for value, unit in matches)
+
+
+def seconds_to_uptime(seconds: int) -> str:
+    # Same format as the uptime of show version, e.g. "2 days, 1 hour, 0 minutes"
+    parts = []
+    for unit, unit_seconds in UPTIME_UNITS.items():
+        value, seconds = divmod(seconds, unit_seconds)
+        if value or parts or unit == "minute":
+            parts.append(f"{value} {unit}{'' if value == 1 else 's'}")
+    return ", ".join(parts)
+
+
+class VersionCache:
+    """
+    Last show version results (version, serial and uptime) of each device, keyed by host:port
+    and persisted in a JSON file, so the collector can skip show version on most sweeps.
+
+    An entry is used until it is ttl seconds old, and never for a session that has just been
+    opened: a device that reloads drops its SSH sessions, so show version is always collected
+    again after a reconnection. Meanwhile, uptime is extrapolated from the time of collection.
+    An expired entry (see expire) is not used either, whatever the session.
+    """
+
+    def __init__(self, path: str, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._dirty = False
+
+    @staticmethod
+    def get_key(result: Dict[str, Any]) -> str:
+        return f'{result.get("device")}:{result.get("port")}'
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.ttl <= 0 or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning("Version cache %s could not be read, starting empty: %s", self.path, e)
+            return {}
+
+    def get(self, result: Dict[str, Any], new_session: bool) -> Optional[Dict[str, str]]:
+        # version, serial and uptime of the device, or None when show version has to be collected
+        if self.ttl <= 0 or new_session:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(self.get_key(result))
+        if entry is None or entry.get("expired"):
+            return None
+
+        age = time.time() - entry["collected_at"]
+        if age >= self.ttl:
+            return None
+
+        uptime = entry["uptime"]
+        if entry.get("uptime_seconds") is not None:
+            uptime = seconds_to_uptime(int(entry["uptime_seconds"] + age))
+
+        return {"version": entry["version"], "serial": entry["serial"], "uptime": uptime}
+
+    def store(self, result: Dict[str, Any]) -> None:
+        # Called with the result of a device whose show version has just been parsed
+        if self.ttl <= 0:
+            return
+
+        key = self.get_key(result)
+        now = time.time()
+        uptime_seconds = uptime_to_seconds(result.get("uptime"))
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.get("serial") != result.get("serial"):
+                logger.info("%s: serial changed from %s to %s", key, previous.get('serial'), result.get('serial'))
+            elif previous is not None and uptime_seconds is not None and previous.get("uptime_seconds") is not None:
+                expected_uptime = previous["uptime_seconds"] + now - previous["collected_at"]
+                if uptime_seconds < expected_uptime - RELOAD_TOLERANCE:
+                    logger.info("%s: reload detected (uptime: %s)", key, result.get('uptime'))
+
+            self._entries[key] = {
+                "serial": result.get("serial"),
+                "version": result.get("version"),
+                "uptime": result.get("uptime"),
+                "uptime_seconds": uptime_seconds,
+                "collected_at": now,
+            }
+            self._dirty = True
+
+    def expire(self, result: Dict[str, Any]) -> None:
+        # show version is collected again on the next session of the device, even a pooled one.
+        # The entry is kept (not removed) so that store still compares the serial and uptime
+        with self._lock:
+            entry = self._entries.get(self.get_key(result))
+            if entry is not None and not entry.get("expired"):
+                entry["expired"] = True
+                self._dirty = True
+
+    def flush(self) -> None:
+        # Written once per sweep, to a temporary file first so a crash never leaves half a file
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = json.dumps(self._entries, indent=4)
+            self._dirty = False
+
+        try:
+            write_atomically(self.path, entries.encode())
+        except OSError as e:
+            # The sweep goes on without persisting the cache, it is tried again on the next one
+            logger.warning("Version cache %s could not be written: %s", self.path, e)
+            with self._lock:
+                self._dirty = True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"devices": len(self._entries), "ttl": self.ttl}
+
+
+_version_cache: Optional[VersionCache] = None
+_version_cache_lock = threading.Lock()
+
+
+def get_version_cache() -> VersionCache:
+    global _version_cache
+
+    with _version_cache_lock:
+        if _version_cache is None:
+            _version_cache = VersionCache(
+                path=os.getenv("STP_VERSION_CACHE_FILE", "./graph/version_cache.json"),
+                ttl=float(os.getenv("STP_VERSION_CACHE_TTL", 86400)),
+            )
+        return _version_cache
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List
+
+from graph.code import collect_devices
+
+# Run it from the backend folder:
+#   py -m helper.benchmark_collector
+# Each fake device sleeps LATENCY seconds, which stands for a full Netmiko session
+# (connect + enable + 3 commands). No real device is contacted.
+
+# Fake devices are not written to the raw output archive, nor checked for TCP reachability
+os.environ["STP_RAW_ARCHIVE"] = "0"
+os.environ["STP_TCP_PRECHECK_TIMEOUT"] = "0"
+
+DEVICE_COUNTS = [100, 500, 2000]
+LATENCY = 0.2
+
+
+def print_execution_time(end_total: float) -> str:
+    if end_total > 1:
+        return f"{end_total:.2f} s"
+    return f"{end_total * 1000:.2f} ms"
+
+
+def fake_connect_to_device(device: Dict[str, Any], device_id: int) -> Dict[str, Any]:
+    time.sleep(LATENCY)
+    return {"device": device.get("host"), "id": device_id, "status": "success"}
+
+
+def build_fake_devices(total_devices: int) -> List[Dict[str, Any]]:
+    return [{"host": f"10.0.{i // 256}.{i % 256}", "port": 22} for i in range(total_devices)]
+
+
+class ThreadSampler:
+    # Samples the number of alive threads while a collection is running
+    def __init__(self) -> None:
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_thread_model(devices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Previous implementation: one thread per device
+    results = []
+    with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        futures = [executor.submit(fake_connect_to_device, device, i) for i, device in enumerate(devices)]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
+
+
+def run_async_model(devices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Fake results have nothing to parse (see helper/benchmark_parse_pool.py for the parsing stage)
+    return asyncio.run(collect_devices(devices, connect=fake_connect_to_device, parse=None))
+
+
+def measure(name: str, function, devices: List[Dict[str, Any]]) -> None:
+    tracemalloc.start()
+    start = time.time()
+    with ThreadSampler() as sampler:
+        results = function(devices)
+    elapsed = time.time() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"  {name:<13} devices={len(results):<6} time={print_execution_time(elapsed):<11} "
+        f"peak_threads={sampler.peak:<6} peak_memory={peak_memory / 1024 / 1024:.1f} MiB"
+    )
+
+
+def main() -> None:
+    max_sessions = os.getenv("STP_MAX_CONCURRENT_SESSIONS", 64)
+    print(f"Fake session latency: {LATENCY} s - STP_MAX_CONCURRENT_SESSIONS: {max_sessions}")
+    for total_devices in DEVICE_COUNTS:
+        devices = build_fake_devices(total_devices)
+        print(f"\n{total_devices} devices")
+        measure("thread model", run_thread_model, devices)
+        measure("async model", run_async_model, devices)
+
+
+if __name__ == "__main__":
+    main()
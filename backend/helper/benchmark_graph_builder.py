@@ -0,0 +1,84 @@
+import time
+from typing import Any, Dict, List
+
+from graph import code
+from graph.topology_index import TopologyIndex
+
+# Run it from the backend folder:
+#   py -m helper.benchmark_graph_builder
+# Builds synthetic results (as returned by connect_to_device) for a binary tree of switches
+# where every pair of siblings is also connected by a redundant link blocked by STP, and
+# times each graph stage. Time per switch should stay flat as the number of switches grows.
+
+SWITCH_COUNTS = [1000, 2500, 5000, 10000]
+
+
+def build_synthetic_results(total_switches: int) -> List[Dict[str, Any]]:
+    results = []
+    for i in range(total_switches):
+        results.append({
+            "device": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+            "port": 22,
+            "device_type": "cisco_ios",
+            "prompt": f"SW{i}",
+            "status": "success",
+            "stp_output_raw": code.CISCO_STP_RAW_OUTPUT_ROOT_BRIDGE_TEXT if i == 0 else "",
+            "stp_output_parsed": [],
+            "cdp_output_parsed": [],
+            "id": i,
+            "label": f"SW{i}",
+            "title": f"SVI: SW{i}\nPlatform: cisco_ios",
+            "level": 9999,
+            "priority": "32769",
+            "mac_address": f"5000.{i // 65536:04x}.{i % 65536:04x}",
+        })
+
+    def connect(a: int, b: int, role_a: str, role_b: str) -> None:
+        for local, remote, role in ((a, b, role_a), (b, a, role_b)):
+            interface = f"G {len(results[local]['cdp_output_parsed'])}/0"
+            results[local]["cdp_output_parsed"].append({
+                "neighbor": f"SW{remote}",
+                "local_interface": interface,
+                "neighbor_interface": f"G {len(results[remote]['cdp_output_parsed'])}/0",
+            })
+            results[local]["stp_output_parsed"].append({"interface": interface, "role": role, "status": "Forwarding"})
+
+    for i in range(1, total_switches):
+        connect((i - 1) // 2, i, "Designated", "Root")
+        # Redundant link between siblings (2k+1, 2k+2): blocked on the second one
+        if i % 2 == 0:
+            connect(i - 1, i, "Designated", "Alternate")
+
+    return results
+
+
+def time_stage(timings: Dict[str, float], name: str, function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    timings[name] = time.perf_counter() - start
+    return value
+
+
+def run_pipeline(results: List[Dict[str, Any]]) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    root_bridge_data = time_stage(timings, "find_root_bridge", code.find_root_bridge, results)
+    index = time_stage(timings, "TopologyIndex", TopologyIndex, results)
+    time_stage(timings, "process_nodes", code.process_nodes, root_bridge_data, results, index)
+    edges = time_stage(timings, "process_edges", code.process_edges, results, index)
+    edges_to_be_deleted = time_stage(timings, "identify_blocked_links", code.identify_blocked_links, results, index)
+    time_stage(timings, "remove_blocked_links", code.remove_blocked_links, edges_to_be_deleted, edges[3])
+    return timings
+
+
+def main() -> None:
+    for total_switches in SWITCH_COUNTS:
+        results = build_synthetic_results(total_switches)
+        timings = run_pipeline(results)
+        total = sum(timings.values())
+        print(f"\n{total_switches} switches - total: {total * 1000:.1f} ms ({total / total_switches * 1e6:.1f} us/switch)")
+        for name, elapsed in timings.items():
+            print(f"  {name:<24} {elapsed * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
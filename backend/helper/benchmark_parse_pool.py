@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from graph import code
+from graph.parse_pool import close_parse_pool
+
+# Run it from the backend folder:
+#   py -m helper.benchmark_parse_pool
+# Each fake device "captures" the show spanning-tree output of a big chassis (VLANS x PORTS
+# port lines) without contacting any device, so only the parsing stage is measured. It is run
+# in the I/O threads (STP_PARSE_WORKERS=0) and in process pools of growing size.
+
+# Fake devices are not written to the raw output archive, nor checked for TCP reachability
+os.environ["STP_RAW_ARCHIVE"] = "0"
+os.environ["STP_TCP_PRECHECK_TIMEOUT"] = "0"
+
+TOTAL_DEVICES = 64
+VLANS = 20
+PORTS = 200
+WORKER_COUNTS = [0, 1, 2, 4, os.cpu_count() or 1]
+
+
+def build_stp_output(vlans: int, ports: int) -> str:
+    blocks = []
+    for vlan in range(1, vlans + 1):
+        lines = [
+            f"VLAN{vlan:04d}",
+            "  Spanning tree enabled protocol rstp",
+            f"  Root ID    Priority    {32768 + vlan}",
+            "             Address     5000.5800.0200",
+            "             Cost        4",
+            "             Port        5 (GigabitEthernet1/0)",
+            "             Hello Time   2 sec  Max Age 20 sec  Forward Delay 15 sec",
+            "",
+            f"  Bridge ID  Priority    {32768 + vlan}  (priority 32768 sys-id-ext {vlan})",
+            "             Address     5042.7200.0d00",
+            "             Hello Time   2 sec  Max Age 20 sec  Forward Delay 15 sec",
+            "             Aging Time  300 sec",
+            "",
+            "Interface           Role Sts Cost      Prio.Nbr Type",
+            "------------------- ---- --- --------- -------- --------------------------------",
+        ]
+        for port in range(ports):
+            role = "Root FWD" if port == 0 else "Desg FWD"
+            lines.append(f"Gi{port // 48 + 1}/0/{port % 48 + 1:<13} {role} 4         128.{port + 1:<5} P2p ")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+STP_OUTPUT = build_stp_output(VLANS, PORTS)
+
+
+def fake_capture_device_output(device: Dict[str, Any], device_id: int) -> Dict[str, Any]:
+    return {
+        "device": device.get("host"),
+        "port": 22,
+        "device_type": "cisco_ios",
+        "prompt": f"SW{device_id}",
+        "status": "success",
+        "stp_output_raw": STP_OUTPUT,
+        "cdp_output_raw": "",
+        "version_output_raw": "",
+        "id": device_id,
+    }
+
+
+def build_fake_devices(total_devices: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "host": f"10.0.{i // 256}.{i % 256}",
+            "device_type": "cisco_ios",
+            "stp_template": "cisco_ios_show_spanning-tree.textfsm",
+            "cdp_template": "cisco_ios_show_cdp_neighbors.textfsm",
+            "version_template": "cisco_ios_show_version.textfsm",
+        }
+        for i in range(total_devices)
+    ]
+
+
+def main() -> None:
+    devices = build_fake_devices(TOTAL_DEVICES)
+    size = len(STP_OUTPUT) * TOTAL_DEVICES / 1024 / 1024
+    print(f"{TOTAL_DEVICES} devices - {VLANS} VLANs x {PORTS} ports each ({size:.1f} MiB of STP output)")
+
+    for workers in WORKER_COUNTS:
+        os.environ["STP_PARSE_WORKERS"] = str(workers)
+        close_parse_pool()
+
+        start = time.perf_counter()
+        results = asyncio.run(code.collect_devices(devices, connect=fake_capture_device_output))
+        elapsed = time.perf_counter() - start
+
+        failed = [result for result in results if result.get("status") != "success"]
+        assert not failed, failed[0].get("status")
+
+        name = "I/O threads" if workers == 0 else f"{workers} processes"
+        print(f"  {name:<14} {elapsed:>7.2f} s ({TOTAL_DEVICES / elapsed:.1f} devices/s)")
+
+    close_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
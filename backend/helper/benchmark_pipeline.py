@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List
+
+from graph import code
+from graph.metrics import get_metrics
+from graph.raw_archive import RawArchive
+from helper.synthetic_topology import KINDS, build_entries, build_links
+
+# Run it from the backend folder:
+#   py -m helper.benchmark_pipeline
+#   py -m helper.benchmark_pipeline --kind mesh --switches 50000 --vlans 16
+# Generates the raw outputs of synthetic topologies (helper/synthetic_topology.py), parses them
+# and builds the topology with code.build_topology, then prints the time of each of its steps.
+# The built topology is checked to be a spanning tree of the generated links.
+#
+# Regression tracking: --save-baseline stores the timings in BASELINE_FILE. Later runs compare
+# each stage against it and exit with status 1 when a stage is more than --tolerance slower.
+# --archive DIR also writes each generated sweep as a raw archive, to be replayed with
+# helper.replay_raw_archive.
+
+DEFAULT_SWITCH_COUNTS = [10, 100, 1000, 10000]
+BASELINE_FILE = "./helper/benchmark_pipeline_baseline.json"
+# Differences below this (seconds) are noise, whatever the ratio
+MINIMUM_REGRESSION = 0.005
+
+
+def run_pipeline(entries: List[Any]) -> Dict[str, Any]:
+    # Parses the outputs and builds the topology with code.build_topology, like code.main does.
+    # The time of each of its steps is read from the stp_graph_stage_seconds histogram (GET /metrics)
+    stages = get_metrics().stage
+    before = stages.sums()
+
+    start = time.perf_counter()
+    results = [code.parse_device_output(dict(result), device) for device, result in entries]
+    timings: Dict[str, float] = {"parse": time.perf_counter() - start}
+
+    data = code.build_topology(results)
+    for (stage,), total in stages.sums().items():
+        timings[stage] = total - before.get((stage,), 0.0)
+
+    start = time.perf_counter()
+    json.dumps(data, default=str)
+    timings["serialization"] = time.perf_counter() - start
+    return {"timings": timings, "data": data}
+
+
+def check_topology(data: Dict[str, Any], switches: int, links: int, vlan_roots: int) -> None:
+    # Every switch is in the graph, every link is drawn and the forwarding links of each VLAN
+    # form a spanning tree (with a single root, the main graph too)
+    assert len(data["nodes"]) == switches, f"{len(data['nodes'])} nodes instead of {switches}"
+    assert len(data["edges_with_blocked_links"]) == links, f"{len(data['edges_with_blocked_links'])} links instead of {links}"
+    if vlan_roots == 1:
+        assert len(data["edges"]) == switches - 1, f"{len(data['edges'])} forwarding links instead of {switches - 1}"
+    for vlan_id, vlan in data["vlans"].items():
+        assert len(vlan["edges"]) == switches - 1, f"VLAN {vlan_id}: {len(vlan['edges'])} forwarding links instead of {switches - 1}"
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the graph pipeline on synthetic topologies")
+    parser.add_argument("--kind", choices=KINDS, default="mesh")
+    parser.add_argument("--switches", type=int, nargs="+", default=DEFAULT_SWITCH_COUNTS)
+    parser.add_argument("--vlans", type=int, default=4)
+    parser.add_argument("--vlan-roots", type=int, default=1, help="Number of different root bridges among the VLANs")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size, the fastest one is kept")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--archive", help="Folder where each generated sweep is written as a raw archive")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline.get("machine") != platform.node():
+        print(f"Baseline recorded on {baseline.get('machine')}, timings may not be comparable")
+
+    measured: Dict[str, Dict[str, float]] = {}
+    regressions: List[str] = []
+    for switches in args.switches:
+        links = build_links(args.kind, switches)
+        start = time.perf_counter()
+        entries = list(build_entries(links, switches, vlans=args.vlans, vlan_roots=args.vlan_roots))
+        generation = time.perf_counter() - start
+        size = sum(len(result["stp_output_raw"]) + len(result["cdp_output_raw"]) + len(result["version_output_raw"]) for _, result in entries)
+
+        if args.archive:
+            RawArchive(root=args.archive, retention_days=0).write(entries)
+
+        runs = [run_pipeline(entries) for _ in range(max(1, args.repeat))]
+        check_topology(runs[-1]["data"], switches, len(links), args.vlan_roots)
+        timings = {name: min(run["timings"][name] for run in runs) for name in runs[0]["timings"]}
+        timings["total"] = sum(timings.values())
+
+        key = f"{args.kind}-{switches}-{args.vlans}-{args.vlan_roots}"
+        measured[key] = timings
+        previous = baseline.get("timings", {}).get(key, {})
+
+        print(f"\n{key}: {switches} switches, {len(links)} links, {args.vlans} VLANs - {size / 1024 / 1024:.1f} MiB of raw output generated in {generation:.2f} s")
+        for name, elapsed in timings.items():
+            line = f"  {name:<30} {elapsed * 1000:>10.1f} ms {elapsed / switches * 1e6:>9.1f} us/switch"
+            if name in previous:
+                ratio = elapsed / previous[name] if previous[name] else 1.0
+                line += f"   baseline {previous[name] * 1000:>10.1f} ms ({ratio - 1:+.0%})"
+                if ratio > 1 + args.tolerance and elapsed - previous[name] > MINIMUM_REGRESSION:
+                    line += "  REGRESSION"
+                    regressions.append(f"{key} {name}")
+            print(line)
+
+    if args.save_baseline:
+        baseline = {
+            "machine": platform.node(),
+            "python": platform.python_version(),
+            "timings": {**baseline.get("timings", {}), **measured},
+        }
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"\nBaseline saved in {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import ast
+import time
+from typing import Callable, List
+
+from graph.stp_parser import parse_stp_output
+from graph.templates import get_template_registry
+from helper.benchmark_parse_pool import build_stp_output
+
+# Run it from the backend folder:
+#   py -m helper.benchmark_stp_parser
+# Checks that graph/stp_parser.py returns the same interface records as the
+# cisco_ios_show_spanning-tree TextFSM template for the outputs saved in script/test/test1.py
+# and for a big chassis output, then prints the parse throughput of both in MB/s.
+
+SAMPLES_FILE = "script/test/test1.py"
+STP_TEMPLATE_NAME = "cisco_ios_show_spanning-tree.textfsm"
+MIN_SECONDS = 1.0
+
+
+def load_samples() -> List[str]:
+    # The results list of test1.py is a literal, so it is read without running the script
+    with open(SAMPLES_FILE, "r") as file:
+        tree = ast.parse(file.read())
+
+    results = next(
+        ast.literal_eval(node.value)
+        for node in tree.body
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "results" for target in node.targets)
+    )
+    return [result["stp_output_raw"] for result in results if result.get("stp_output_raw")]
+
+
+def parse_with_textfsm(stp_output_raw: str):
+    return get_template_registry().parse(STP_TEMPLATE_NAME, stp_output_raw)
+
+
+def parse_with_native_parser(stp_output_raw: str):
+    return parse_stp_output(stp_output_raw)["interfaces"]
+
+
+def measure_throughput(function: Callable[[str], object], outputs: List[str]) -> float:
+    # MB of output parsed per second, repeating the outputs for at least MIN_SECONDS
+    size = sum(len(output) for output in outputs)
+    parsed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < MIN_SECONDS:
+        for output in outputs:
+            function(output)
+        parsed += size
+    return parsed / (time.perf_counter() - start) / 1e6
+
+
+def main() -> None:
+    lab_outputs = load_samples()
+    big_chassis_output = build_stp_output(vlans=20, ports=200)
+
+    for output in lab_outputs + [big_chassis_output]:
+        assert parse_with_native_parser(output) == parse_with_textfsm(output), "Different interface records"
+    print(f"Same records as the TextFSM template for {len(lab_outputs)} lab outputs and 1 big chassis output")
+
+    for name, outputs in (("lab outputs", lab_outputs), ("big chassis", [big_chassis_output])):
+        textfsm_throughput = measure_throughput(parse_with_textfsm, outputs)
+        native_throughput = measure_throughput(parse_with_native_parser, outputs)
+        print(f"\n{name} ({sum(len(output) for output in outputs) / 1024:.1f} KiB)")
+        print(f"  {'TextFSM template':<18} {textfsm_throughput:>7.2f} MB/s")
+        print(f"  {'native parser':<18} {native_throughput:>7.2f} MB/s ({native_throughput / textfsm_throughput:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import ast
+import time
+from typing import Any, Dict, List, Tuple
+
+from netmiko.utilities import get_structured_data
+
+from graph.templates import get_template_registry
+
+# Run it from the backend folder:
+#   py -m helper.benchmark_templates
+# Parses the STP and CDP outputs saved in script/test/test1.py with netmiko's get_structured_data
+# (reads and compiles the template on every call) and with the template registry (compiled once,
+# parsers reused), checks both return the same records and prints the cost per device.
+
+TEMPLATES_DIR = "my_own_ntc_templates/modified"
+SAMPLES_FILE = "script/test/test1.py"
+ITERATIONS = 200
+
+COMMANDS = {
+    "stp_output_raw": ("cisco_ios_show_spanning-tree.textfsm", "show spanning-tree"),
+    "cdp_output_raw": ("cisco_ios_show_cdp_neighbors.textfsm", "show cdp neighbors"),
+}
+
+
+def load_samples() -> List[Tuple[str, str, str]]:
+    # The results list of test1.py is a literal, so it is read without running the script
+    with open(SAMPLES_FILE, "r") as file:
+        tree = ast.parse(file.read())
+
+    results = next(
+        ast.literal_eval(node.value)
+        for node in tree.body
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "results" for target in node.targets)
+    )
+
+    return [
+        (template_name, command, result[key])
+        for result in results
+        for key, (template_name, command) in COMMANDS.items()
+        if result.get(key)
+    ]
+
+
+def parse_with_netmiko(template_name: str, command: str, raw_output: str) -> Any:
+    return get_structured_data(
+        raw_output=raw_output,
+        platform="cisco_ios",
+        command=command,
+        template=f"{TEMPLATES_DIR}/{template_name}",
+    )
+
+
+def parse_with_registry(template_name: str, command: str, raw_output: str) -> Any:
+    return get_template_registry().parse(template_name, raw_output)
+
+
+def time_parser(function, samples: List[Tuple[str, str, str]]) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for sample in samples:
+            function(*sample)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    samples = load_samples()
+    devices = len(samples) / len(COMMANDS)
+
+    for sample in samples:
+        expected = parse_with_netmiko(*sample)
+        if isinstance(expected, str):
+            # get_structured_data returns the raw output when nothing is parsed
+            expected = []
+        assert parse_with_registry(*sample) == expected, f"Different records for {sample[0]}"
+
+    timings: Dict[str, float] = {
+        "get_structured_data": time_parser(parse_with_netmiko, samples),
+        "TemplateRegistry.parse": time_parser(parse_with_registry, samples),
+    }
+
+    print(f"{len(samples)} outputs ({devices:.0f} devices) x {ITERATIONS} iterations")
+    for name, elapsed in timings.items():
+        print(f"  {name:<24} {elapsed / (ITERATIONS * devices) * 1e6:>9.1f} us/device")
+    print(f"  speedup: {timings['get_structured_data'] / timings['TemplateRegistry.parse']:.1f}x")
+    print(f"  registry: {get_template_registry().stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import logging
+import sys
+import tempfile
+
+from netmiko import ConnectHandler
+
+from graph import code
+from helper.ssh_simulator import Simulator, build_devices, write_credentials
+from helper.synthetic_topology import build_entries, build_links
+
+# Run it from the backend folder:
+#   py -m helper.check_batched_commands
+# Starts a simulated device (helper/ssh_simulator.py) and checks on a single SSH session that
+# code.send_commands_batched returns the same outputs as send_command, as it does on the pooled
+# sessions of the collector: a first batch, a second batch, then a batch after a send_command.
+# Exits with status 1 when an output differs or a batch fails.
+
+BASE_PORT = 22900
+
+
+def main() -> None:
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    device, result = next(build_entries(build_links("ring", 3), 3, vlans=2))
+    commands = [
+        device.get("spanning_tree_command", "show spanning-tree"),
+        device.get("cdp_neighbors_command", "show cdp neighbors"),
+        device.get("version_command", "show version"),
+    ]
+    simulated = build_devices([(device, result)], BASE_PORT, 0.0, 0.0, 0.0, 0.0, 0)
+    simulator = Simulator(simulated)
+    simulator.start()
+
+    failures = []
+    try:
+        credentials = tempfile.NamedTemporaryFile(suffix=".json", delete=False).name
+        write_credentials(simulated, "127.0.0.1", credentials)
+        netmiko_device = code.get_netmiko_device(code.load_credentials(credentials)[0])
+
+        connection = ConnectHandler(**netmiko_device)
+        try:
+            connection.enable()
+            connection.find_prompt()
+            expected = [connection.send_command(command) for command in commands]
+
+            steps = [("first batch", None), ("second batch", None), ("batch after send_command", commands[-1])]
+            for name, command_before in steps:
+                if command_before is not None:
+                    connection.send_command(command_before)
+                try:
+                    outputs = code.send_commands_batched(connection, commands)
+                except Exception as e:
+                    outputs = []
+                    failures.append(f"{name}: {e}")
+                for command, output, expected_output in zip(commands, outputs, expected):
+                    if output.strip() != expected_output.strip():
+                        failures.append(f"{name}: output of {command} differs from send_command")
+                print(f"{name}: {'FAILED' if any(failure.startswith(name + ':') for failure in failures) else 'OK'}")
+        finally:
+            connection.disconnect()
+    finally:
+        simulator.stop()
+
+    for failure in failures:
+        print(f"  {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
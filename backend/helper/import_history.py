@@ -0,0 +1,28 @@
+from graph.history_db import get_history_db
+from graph.snapshot_store import get_snapshot_store
+
+# Run it from the backend folder:
+#   py -m helper.import_history
+# Records in the history database (graph/history.sqlite3) the topologies already in the snapshot
+# store, e.g. after helper.migrate_saved_data. Records merged by compaction only keep their first
+# and last snapshot, so both are recorded. Snapshots already in the database are replaced.
+
+
+def main() -> None:
+    store = get_snapshot_store()
+    history_db = get_history_db()
+
+    recorded = 0
+    for record in store.read_index():
+        data = store.load(record["id"])
+        history_db.record(record, data)
+        recorded += 1
+        if "until_id" in record:
+            history_db.record({"id": record["until_id"], "timestamp": record["until"], "hash": record["hash"]}, data)
+            recorded += 1
+
+    print(f"{recorded} snapshots recorded in {history_db.path}")
+
+
+if __name__ == "__main__":
+    main()
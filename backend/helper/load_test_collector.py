@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+
+# The collector state of a load test is kept apart from the app's: no raw archive of the
+# simulated devices and a temporary version cache
+os.environ["STP_RAW_ARCHIVE"] = "0"
+os.environ.setdefault("STP_VERSION_CACHE_FILE", os.path.join(tempfile.gettempdir(), "stp_load_test_version_cache.json"))
+
+from graph import code
+from graph.device_health import get_device_health
+from graph.parse_pool import close_parse_pool
+from graph.session_pool import get_session_pool
+
+# Run it from the backend folder, with helper.ssh_simulator running in another terminal:
+#   py -m helper.load_test_collector --sweeps 3
+# Runs code.collect_devices against the devices of a credentials file (by default the one
+# written by helper.ssh_simulator) several times in a row and prints, for each sweep, the time
+# taken and the status of the devices. The first sweep opens the SSH sessions, the next ones
+# reuse them from the session pool. The topology of the last sweep is built and summarized.
+# STP_MAX_CONCURRENT_SESSIONS, STP_PARSE_WORKERS, etc. apply as in the app.
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs the collector against simulated devices")
+    parser.add_argument("--credentials", default="./helper/simulated_device_credentials.json")
+    parser.add_argument("--sweeps", type=int, default=3)
+    args = parser.parse_args()
+
+    # paramiko logs a traceback for every session dropped by a device that timed out
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    devices = code.load_credentials(args.credentials)
+    print(f"{len(devices)} devices in {args.credentials} - {os.getenv('STP_MAX_CONCURRENT_SESSIONS', 64)} concurrent sessions")
+
+    results = []
+    for sweep in range(1, args.sweeps + 1):
+        start = time.perf_counter()
+        results = asyncio.run(code.collect_devices(devices))
+        elapsed = time.perf_counter() - start
+
+        statuses = Counter(result.get("status", "").split(":")[0] for result in results)
+        print(f"Sweep {sweep}: {elapsed:.2f} s ({len(devices) / elapsed:.1f} devices/s) - {dict(statuses)} - {get_session_pool().stats()} - {get_device_health().stats()}")
+        failures = Counter(result.get("status") for result in results if result.get("status", "").startswith("other_failure"))
+        for status, count in failures.most_common(3):
+            print(f"  {count} x {status}")
+
+    successful = [result for result in results if result.get("status") == "success"]
+    if successful:
+        data = code.build_topology(successful)
+        if data.get("error"):
+            print(f"Topology: {data.get('error_description')}")
+        else:
+            print(
+                f"Topology: {len(data.get('nodes'))} nodes, {len(data.get('edges'))} edges "
+                f"({len(data.get('edges_with_blocked_links')) - len(data.get('edges'))} blocked), "
+                f"{len(data.get('vlans'))} VLANs, {len(json.dumps(data, default=str)) / 1024:.0f} KiB"
+            )
+
+    get_session_pool().close_all()
+    get_device_health().close()
+    close_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict
+
+from graph.snapshot_store import SNAPSHOT_PARTS, SnapshotStore, get_snapshot_store
+
+# Run it from the backend folder:
+#   py -m helper.migrate_saved_data
+# Imports the graph/saved_data/<counter>-<timestamp>/ folders written by previous versions into
+# the snapshot store (graph/snapshots), keeping their counter as snapshot id and their timestamp.
+# Folders already imported are skipped. graph/saved_data is not modified: remove it by hand once
+# the migration has been checked. The migration itself drops nothing, but the retention of the
+# app (STP_SNAPSHOT_RETENTION_DAYS, STP_SNAPSHOT_MAX_RECORDS) applies on its next compaction.
+
+SAVED_DATA_DIR = "./graph/saved_data"
+
+
+def get_directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, file_name))
+        for directory, _, file_names in os.walk(path)
+        for file_name in file_names
+    )
+
+
+def load_saved_data(dir_path: str) -> Dict[str, Any]:
+    data = {}
+    for part in SNAPSHOT_PARTS:
+        file_path = os.path.join(dir_path, f"{part}.json")
+        if os.path.exists(file_path):
+            with open(file_path, "r") as file:
+                data[part] = json.load(file)
+    return data
+
+
+def main() -> None:
+    # Same folder as the app, without retention nor automatic compaction
+    app_store = get_snapshot_store()
+    store = SnapshotStore(root=app_store.root, counter_path=app_store.counter_path, retention_days=0, max_records=0, compact_every=0)
+    imported_ids = {
+        snapshot_id
+        for record in store.read_index()
+        for snapshot_id in range(record["id"], record.get("until_id", record["id"]) + 1)
+    }
+
+    folders = []
+    for folder in os.listdir(SAVED_DATA_DIR):
+        counter, _, formatted_time = folder.partition("-")
+        if counter.isdigit():
+            folders.append((int(counter), datetime.strptime(formatted_time, "%Y-%m-%d_%H-%M-%S"), folder))
+
+    imported = 0
+    for counter, timestamp, folder in sorted(folders):
+        if counter in imported_ids:
+            continue
+        store.save(load_saved_data(os.path.join(SAVED_DATA_DIR, folder)), timestamp=timestamp, snapshot_id=counter)
+        imported += 1
+
+    stats = store.compact()
+    print(f"{imported} of {len(folders)} folders imported ({len(folders) - imported} already in the store)")
+    print(f"Index: {stats['records']} records after merging identical consecutive topologies")
+    print(f"{SAVED_DATA_DIR}: {get_directory_size(SAVED_DATA_DIR) / 1024:.0f} KiB - {store.root}: {get_directory_size(store.root) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
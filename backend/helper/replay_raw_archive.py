@@ -0,0 +1,52 @@
+import asyncio
+import sys
+import time
+
+from graph import code
+from graph.diff import diff_topologies
+from graph.parse_pool import close_parse_pool
+from graph.raw_archive import get_raw_archive
+
+# Run it from the backend folder:
+#   py -m helper.replay_raw_archive [archive.jsonl.gz ...]
+# Rebuilds the topology of each archived sweep (every archive in STP_RAW_ARCHIVE_DIR when none
+# is given) with code.main(replay_path=...), without contacting any device nor saving anything,
+# and prints its root bridge, its size, the time taken and whether it changed from the previous
+# one. Useful to check a change of the parsing logic against recorded outputs.
+
+
+def main() -> None:
+    archive = get_raw_archive()
+    paths = sys.argv[1:] or (archive.list() if archive is not None else [])
+    if not paths:
+        print("No raw archives found")
+        return
+
+    previous = None
+    total_elapsed = 0.0
+    for path in paths:
+        start = time.perf_counter()
+        data = asyncio.run(code.main(replay_path=path))
+        elapsed = time.perf_counter() - start
+        total_elapsed += elapsed
+
+        if data.get("error"):
+            print(f"{path}: {data.get('error_description')}")
+            continue
+
+        blocked_ports = sum(len(value.get("interfaces")) for entry in data.get("blocked_interfaces") or [] for value in entry.values())
+        changed = previous is not None and diff_topologies(previous, data)["changed"]
+        root_bridge = next((node.get("label") for node in data.get("nodes") if node.get("level") == 0), None)
+        print(
+            f"{path}: root {root_bridge} - {len(data.get('nodes'))} nodes, {len(data.get('edges'))} edges, "
+            f"{blocked_ports} blocked ports, {len(data.get('vlans') or {})} VLANs - {elapsed * 1000:.1f} ms"
+            f"{' - changed' if changed else ''}"
+        )
+        previous = data
+
+    close_parse_pool()
+    print(f"{len(paths)} sweeps replayed in {total_elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
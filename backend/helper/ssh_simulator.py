@@ -0,0 +1,303 @@
+import argparse
+import json
+import logging
+import os
+import random
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import paramiko
+
+from graph.raw_archive import RawArchive
+from helper.synthetic_topology import KINDS, VERSION_OUTPUT, build_entries, build_links
+
+# Run it from the backend folder:
+#   py -m helper.ssh_simulator --kind mesh --switches 2000 --latency 0.05
+#   py -m helper.ssh_simulator --archive graph/raw_archive/2024-07-12/12-09-01-1234.jsonl.gz
+# Starts one SSH server per virtual device on consecutive localhost ports, emulating the Cisco
+# IOS prompts, enable and the show spanning-tree / show cdp neighbors / show version commands
+# with the outputs of a synthetic topology (helper/synthetic_topology.py) or of a recorded
+# sweep (a raw archive). Writes a device_credentials.json like file for them, so the collector
+# can be run against them with helper.load_test_collector, then serves until Ctrl+C.
+#
+# paramiko (already installed with netmiko) provides the SSH server side. Some devices can be
+# made to time out (they accept the TCP connection but never answer) or to reject the password.
+
+USERNAME = "admin"
+PASSWORD = "admin"
+SECRET = "secret"
+INVALID_INPUT = "% Invalid input detected at '^' marker."
+
+
+class SimulatedDevice:
+    """
+    Virtual switch: its hostname, the output of each supported command and how it behaves
+    ("ok", "timeout" or "auth_failure")
+    """
+
+    def __init__(self, hostname: str, outputs: Dict[str, str], port: int, behavior: str = "ok", latency: float = 0.0, jitter: float = 0.0) -> None:
+        self.hostname = hostname
+        self.outputs = outputs
+        self.port = port
+        self.behavior = behavior
+        self.latency = latency
+        self.jitter = jitter
+
+    def delay(self) -> None:
+        # Time the device takes to answer a command
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+
+class DeviceServer(paramiko.ServerInterface):
+    def __init__(self, device: SimulatedDevice) -> None:
+        self.device = device
+        self.shell_requested = threading.Event()
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if self.device.behavior != "auth_failure" and username == USERNAME and password == PASSWORD:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args) -> bool:
+        return True
+
+    def check_channel_shell_request(self, channel) -> bool:
+        self.shell_requested.set()
+        return True
+
+
+def read_lines(channel: paramiko.Channel):
+    # Lines typed by the client, ended by \r, \n or \r\n. Null bytes (sent by Netmiko's
+    # is_alive() to health check the idle sessions) are ignored, like IOS does
+    buffer = ""
+    while True:
+        data = channel.recv(4096)
+        if not data:
+            return
+        buffer += data.decode(errors="replace").replace("\x00", "").replace("\r\n", "\n").replace("\r", "\n")
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            yield line
+
+
+def run_shell(channel: paramiko.Channel, device: SimulatedDevice) -> None:
+    # Echoes each line like a terminal and answers it followed by the prompt
+    enabled = False
+    waiting_for_secret = False
+
+    def send(text: str) -> None:
+        channel.sendall(text.replace("\n", "\r\n").encode())
+
+    def prompt() -> str:
+        return f"{device.hostname}{'#' if enabled else '>'}"
+
+    send(f"\n{prompt()}")
+    for line in read_lines(channel):
+        command = line.strip()
+
+        if waiting_for_secret:
+            # The secret is not echoed
+            waiting_for_secret = False
+            if command == SECRET:
+                enabled = True
+                send(f"\n{prompt()}")
+            else:
+                send(f"\n% Access denied\n\n{prompt()}")
+            continue
+
+        send(f"{line}\n")
+        if command in ("exit", "quit", "logout"):
+            break
+        if command == "enable" and not enabled:
+            waiting_for_secret = True
+            send("Password: ")
+            continue
+
+        if not command or command.startswith("terminal ") or command == "enable":
+            output = ""
+        elif command in device.outputs and enabled:
+            device.delay()
+            output = device.outputs[command]
+        else:
+            output = INVALID_INPUT
+
+        send(f"{output.rstrip()}\n{prompt()}" if output else prompt())
+    channel.close()
+
+
+class Simulator:
+    """
+    One listening socket per device, all served by a single accept thread. Each SSH session
+    runs in its own threads (paramiko's transport thread and the shell thread)
+    """
+
+    def __init__(self, devices: List[SimulatedDevice], host: str = "127.0.0.1") -> None:
+        self.devices = devices
+        self.host = host
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.selector = selectors.DefaultSelector()
+        self._silent: List[socket.socket] = []
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        for device in self.devices:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, device.port))
+            listener.listen(16)
+            listener.setblocking(False)
+            self.selector.register(listener, selectors.EVENT_READ, device)
+
+        self._thread = threading.Thread(target=self._accept_loop, name="ssh-simulator", daemon=True)
+        self._thread.start()
+
+    def _accept_loop(self) -> None:
+        while not self._stopped.is_set():
+            for key, _ in self.selector.select(timeout=0.5):
+                try:
+                    connection, _ = key.fileobj.accept()
+                except BlockingIOError:
+                    continue
+                connection.setblocking(True)
+                threading.Thread(target=self._serve, args=(connection, key.data), daemon=True).start()
+
+    def _serve(self, connection: socket.socket, device: SimulatedDevice) -> None:
+        if device.behavior == "timeout":
+            # Accepts the connection but never sends the SSH banner
+            self._silent.append(connection)
+            return
+
+        transport = paramiko.Transport(connection)
+        transport.add_server_key(self.host_key)
+        server = DeviceServer(device)
+        try:
+            transport.start_server(server=server)
+            channel = transport.accept(timeout=30)
+            if channel is None or not server.shell_requested.wait(timeout=30):
+                return
+            run_shell(channel, device)
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+        finally:
+            transport.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        for connection in self._silent:
+            connection.close()
+
+
+def build_devices(entries: List[Any], base_port: int, latency: float, jitter: float, timeout_ratio: float, auth_failure_ratio: float, seed: int) -> List[SimulatedDevice]:
+    # entries: (device, captured result) pairs, from the synthetic generator or a raw archive
+    generator = random.Random(seed)
+    devices = []
+    for i, (device, result) in enumerate(entries):
+        outputs = {
+            device.get("spanning_tree_command", "show spanning-tree"): result.get("stp_output_raw") or "",
+            device.get("cdp_neighbors_command", "show cdp neighbors"): result.get("cdp_output_raw") or "",
+            # Archived sweeps have no show version output when it came from the version cache
+            device.get("version_command", "show version"): result.get("version_output_raw") or VERSION_OUTPUT.format(hostname=result.get("prompt"), uptime="1 hour, 0 minutes", serial=f"{i:010d}"),
+        }
+        draw = generator.random()
+        if result.get("status") != "success" or draw < timeout_ratio:
+            behavior = "timeout"
+        elif draw < timeout_ratio + auth_failure_ratio:
+            behavior = "auth_failure"
+        else:
+            behavior = "ok"
+        devices.append(SimulatedDevice(result.get("prompt") or f"SW{i}", outputs, base_port + i, behavior, latency, jitter))
+    return devices
+
+
+def write_credentials(devices: List[SimulatedDevice], host: str, path: str) -> None:
+    credentials = [
+        {
+            "host": host,
+            "port": device.port,
+            "username": USERNAME,
+            "password": PASSWORD,
+            "secret": SECRET,
+            "device_type": "cisco_ios",
+            "stp_template": "cisco_ios_show_spanning-tree.textfsm",
+            "cdp_template": "cisco_ios_show_cdp_neighbors.textfsm",
+            "version_template": "cisco_ios_show_version.textfsm",
+        }
+        for device in devices
+    ]
+    with open(path, "w") as file:
+        json.dump(credentials, file, indent=4)
+
+
+def raise_open_files_limit() -> None:
+    # One listening socket per device plus one per session
+    if os.name == "nt":
+        return
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local SSH servers emulating Cisco IOS switches")
+    parser.add_argument("--archive", help="Raw archive whose outputs are served (instead of a synthetic topology)")
+    parser.add_argument("--kind", choices=KINDS, default="mesh")
+    parser.add_argument("--switches", type=int, default=100)
+    parser.add_argument("--vlans", type=int, default=1)
+    parser.add_argument("--vlan-roots", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each command takes to answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random variation of the latency (seconds)")
+    parser.add_argument("--timeout-ratio", type=float, default=0.0, help="Fraction of devices that never answer")
+    parser.add_argument("--auth-failure-ratio", type=float, default=0.0, help="Fraction of devices that reject the password")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--credentials", default="./helper/simulated_device_credentials.json")
+    args = parser.parse_args()
+
+    if args.archive:
+        _, entries = RawArchive.read(args.archive)
+    else:
+        entries = list(build_entries(build_links(args.kind, args.switches, seed=args.seed), args.switches, vlans=args.vlans, vlan_roots=args.vlan_roots))
+
+    # Clients dropping their sessions are expected, not worth a traceback
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    devices = build_devices(entries, args.base_port, args.latency, args.jitter, args.timeout_ratio, args.auth_failure_ratio, args.seed)
+    raise_open_files_limit()
+    simulator = Simulator(devices, host=args.host)
+    simulator.start()
+    write_credentials(devices, args.host, args.credentials)
+
+    behaviors = {behavior: sum(device.behavior == behavior for device in devices) for behavior in ("ok", "timeout", "auth_failure")}
+    print(f"{len(devices)} devices listening on {args.host}:{args.base_port}-{args.base_port + len(devices) - 1} {behaviors}")
+    print(f"Credentials written to {args.credentials}. Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List
+
+from graph.snapshot_store import SnapshotStore
+
+# Run it from the backend folder:
+#   py -m helper.stress_snapshot_store
+# Saves SAVES_PER_WORKER topologies from each of PROCESSES processes (like the uvicorn workers),
+# THREADS_PER_PROCESS at a time, into a temporary snapshot store, then checks that every save got
+# its own id, that the counter and the index agree and that every snapshot can be loaded back.
+
+PROCESSES = 4
+THREADS_PER_PROCESS = 8
+SAVES_PER_WORKER = 100
+# Few different topologies, so most saves are deduplicated and compaction merges records
+DIFFERENT_TOPOLOGIES = 5
+
+
+def open_store(root: str) -> SnapshotStore:
+    return SnapshotStore(
+        root=root,
+        counter_path=os.path.join(root, "counter.txt"),
+        retention_days=0,
+        max_records=0,
+        compact_every=50,
+    )
+
+
+def run_worker(root: str, worker: int) -> List[int]:
+    store = open_store(root)
+
+    def save(i: int) -> int:
+        topology = (worker + i) % DIFFERENT_TOPOLOGIES
+        data = {"nodes": [{"id": topology}], "edges": [{"from": topology, "to": topology + 1}]}
+        return store.save(data)["id"]
+
+    with ThreadPoolExecutor(max_workers=THREADS_PER_PROCESS) as executor:
+        return list(executor.map(save, range(SAVES_PER_WORKER)))
+
+
+def main() -> None:
+    root = tempfile.mkdtemp(prefix="snapshot_store_")
+    total = PROCESSES * SAVES_PER_WORKER
+    try:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=PROCESSES) as executor:
+            ids = [snapshot_id for worker_ids in executor.map(run_worker, [root] * PROCESSES, range(PROCESSES)) for snapshot_id in worker_ids]
+        elapsed = time.perf_counter() - start
+
+        store = open_store(root)
+        store.compact()
+
+        assert len(ids) == total, f"{len(ids)} saves instead of {total}"
+        assert sorted(ids) == list(range(1, total + 1)), "Duplicated or missing snapshot ids"
+        with open(store.counter_path, "r") as file:
+            assert int(file.read()) == total + 1, "Counter does not match the number of saves"
+
+        for snapshot_id in ids:
+            snapshot = store.load(snapshot_id)
+            assert snapshot is not None, f"Snapshot {snapshot_id} not found in the index"
+            assert snapshot["edges"][0]["to"] == snapshot["nodes"][0]["id"] + 1, f"Snapshot {snapshot_id} is corrupted"
+
+        leftovers = [name for _, _, names in os.walk(root) for name in names if name.endswith(".tmp")]
+        assert not leftovers, f"Temporary files left behind: {leftovers}"
+
+        print(
+            f"{total} parallel saves ({PROCESSES} processes x {THREADS_PER_PROCESS} threads) in {elapsed:.2f} s: "
+            f"ids 1..{total} without duplicates, {len(store.read_index())} index records after compaction"
+        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import random
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from graph.version_cache import seconds_to_uptime
+
+# Generates the raw outputs of show spanning-tree, show cdp neighbors and show version that a
+# network of IOSv switches would return, for trees, rings and meshes of any size. Port roles
+# come from running the spanning tree algorithm on the generated links, so the graph built from
+# these outputs must be a spanning tree of them. Used by helper.benchmark_pipeline:
+#
+#   entries = build_entries(build_links("mesh", 1000), 1000, vlans=8)
+#
+# Each entry is a (device, captured result) pair, the same format as the raw archive
+# (graph/raw_archive.py), so it can be parsed with code.parse_device_output or replayed.
+
+KINDS = ("tree", "ring", "mesh")
+
+PATH_COST = 4
+VERSION_OUTPUT = """Cisco IOS Software, IOSv Software (VIOS-ADVENTERPRISEK9-M), Version 15.6(2)T, RELEASE SOFTWARE (fc2)
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2016 by Cisco Systems, Inc.
+Compiled Tue 22-Mar-16 16:19 by prod_rel_team
+
+
+ROM: Bootstrap program is IOSv
+
+{hostname} uptime is {uptime}
+System returned to ROM by reload
+System image file is "flash0:/vios-adventerprisek9-m"
+Last reload reason: Unknown reason
+
+cisco IOSv (revision 1.0) with  with 460033K/62464K bytes of memory.
+Processor board ID 9{serial}
+4 Gigabit Ethernet interfaces
+DRAM configuration is 72 bits wide with parity disabled.
+256K bytes of non-volatile configuration memory.
+2097152K bytes of ATA System CompactFlash 0 (Read/Write)
+0K bytes of ATA CompactFlash 1 (Read/Write)
+
+Configuration register is 0x101
+"""
+CDP_HEADER = """Capability Codes: R - Router, T - Trans Bridge, B - Source Route Bridge
+                  S - Switch, H - Host, I - IGMP, r - Repeater, P - Phone,
+                  D - Remote, C - CVTA, M - Two-port Mac Relay
+
+Device ID        Local Intrfce     Holdtme    Capability  Platform  Port ID
+"""
+STP_ROLES = {"Root": "Root FWD", "Designated": "Desg FWD", "Alternate": "Altn BLK"}
+
+
+def build_links(kind: str, switches: int, seed: int = 0, extra_links: int = 1) -> List[Tuple[int, int]]:
+    # tree: binary tree. ring: one ring through every switch. mesh: binary tree plus extra_links
+    # random links per switch. Switch 0 is the root bridge of VLAN 1
+    if kind == "tree":
+        return [((i - 1) // 2, i) for i in range(1, switches)]
+    if kind == "ring":
+        return [(i, (i + 1) % switches) for i in range(switches)] if switches > 2 else [(0, 1)][:switches - 1]
+    if kind == "mesh":
+        generator = random.Random(seed)
+        links = {((i - 1) // 2, i) for i in range(1, switches)}
+        for i in range(switches if switches > 2 else 0):
+            for _ in range(extra_links):
+                j = generator.randrange(switches)
+                if j != i:
+                    links.add((min(i, j), max(i, j)))
+        return sorted(links)
+    raise ValueError(f"Unknown topology kind {kind}, expected one of {KINDS}")
+
+
+def get_interface(port: int) -> Tuple[str, str, str]:
+    # (STP name, CDP name, full name) of the port-th interface of a switch: 4 ports per slot like IOSv
+    slot, number = divmod(port, 4)
+    return f"Gi{slot}/{number}", f"Gig {slot}/{number}", f"GigabitEthernet{slot}/{number}"
+
+
+def get_mac_address(switch: int) -> str:
+    return f"5000.{switch // 65536:04x}.{switch % 65536:04x}"
+
+
+def compute_port_roles(switches: int, ports: List[List[Tuple[int, int]]], root: int) -> Tuple[List[int], List[Dict[int, str]]]:
+    # ports[switch]: (neighbor, neighbor port) of each port. Every link has the same cost and the
+    # bridge ID grows with the switch number, so ties are broken by the lowest switch, then port.
+    # Returns the distance of each switch to the root and the role of each of its ports
+    distance = [-1] * switches
+    distance[root] = 0
+    queue = deque([root])
+    while queue:
+        switch = queue.popleft()
+        for neighbor, _ in ports[switch]:
+            if distance[neighbor] < 0:
+                distance[neighbor] = distance[switch] + 1
+                queue.append(neighbor)
+
+    root_port: List[Optional[int]] = [None] * switches
+    for switch in range(switches):
+        candidates = [
+            (neighbor, neighbor_port, port)
+            for port, (neighbor, neighbor_port) in enumerate(ports[switch])
+            if distance[neighbor] >= 0 and distance[neighbor] == distance[switch] - 1
+        ]
+        if switch != root and candidates:
+            root_port[switch] = min(candidates)[2]
+
+    roles: List[Dict[int, str]] = [{} for _ in range(switches)]
+    for switch in range(switches):
+        for port, (neighbor, neighbor_port) in enumerate(ports[switch]):
+            if port == root_port[switch]:
+                roles[switch][port] = "Root"
+            elif neighbor_port == root_port[neighbor]:
+                roles[switch][port] = "Designated"
+            else:
+                # The end closer to the root (then with the lowest bridge ID) forwards the segment
+                roles[switch][port] = "Designated" if (distance[switch], switch, port) < (distance[neighbor], neighbor, neighbor_port) else "Alternate"
+    return distance, roles
+
+
+def build_stp_output(switch: int, vlans: List[Tuple[int, int, List[int], List[Dict[int, str]], List[List[Tuple[int, int]]]]]) -> str:
+    # vlans: (vlan id, root switch, distances, roles, ports) of each VLAN
+    blocks = []
+    for vlan_id, root, distance, roles, ports in vlans:
+        own_priority = (4096 if switch == root else 32768) + vlan_id
+        root_priority = 4096 + vlan_id
+        lines = [
+            f"VLAN{vlan_id:04d}",
+            "  Spanning tree enabled protocol rstp",
+            f"  Root ID    Priority    {root_priority}",
+            f"             Address     {get_mac_address(root)}",
+        ]
+        if switch == root:
+            lines.append("             This bridge is the root")
+        else:
+            root_port = next(port for port, role in roles[switch].items() if role == "Root")
+            lines.append(f"             Cost        {PATH_COST * distance[switch]}")
+            lines.append(f"             Port        {root_port + 1} ({get_interface(root_port)[2]})")
+        lines += [
+            "             Hello Time   2 sec  Max Age 20 sec  Forward Delay 15 sec",
+            "",
+            f"  Bridge ID  Priority    {own_priority:<7}(priority {own_priority - vlan_id} sys-id-ext {vlan_id})",
+            f"             Address     {get_mac_address(switch)}",
+            "             Hello Time   2 sec  Max Age 20 sec  Forward Delay 15 sec",
+            "             Aging Time  300 sec",
+            "",
+            "Interface           Role Sts Cost      Prio.Nbr Type",
+            "------------------- ---- --- --------- -------- --------------------------------",
+        ]
+        for port in range(len(ports[switch])):
+            lines.append(f"{get_interface(port)[0]:<19} {STP_ROLES[roles[switch][port]]} {PATH_COST:<9} {f"128.{port + 1}":<8} P2p ")
+        blocks.append("\n".join(lines))
+    return "\n" + "\n\n".join(blocks) + "\n\n"
+
+
+def build_cdp_output(switch: int, ports: List[List[Tuple[int, int]]]) -> str:
+    lines = [CDP_HEADER.rstrip("\n")]
+    for port, (neighbor, neighbor_port) in enumerate(ports[switch]):
+        lines.append(f"SW{neighbor}.lab.local")
+        lines.append(f"                 {get_interface(port)[1]:<18}{150:<16}R S I            {get_interface(neighbor_port)[1]}")
+    lines.append("")
+    lines.append(f"Total cdp entries displayed : {len(ports[switch])}")
+    return "\n".join(lines)
+
+
+def build_entries(links: List[Tuple[int, int]], switches: int, vlans: int = 1, vlan_roots: int = 1) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    # One (device, captured result) pair per switch. VLAN v has switch (v - 1) % vlan_roots as
+    # root bridge, so the spanning tree is only computed vlan_roots times
+    ports: List[List[Tuple[int, int]]] = [[] for _ in range(switches)]
+    for a, b in links:
+        ports[a].append((b, len(ports[b])))
+        ports[b].append((a, len(ports[a]) - 1))
+
+    trees = {root: compute_port_roles(switches, ports, root) for root in range(min(vlan_roots, switches))}
+    vlan_trees = [(vlan_id, (vlan_id - 1) % len(trees), *trees[(vlan_id - 1) % len(trees)], ports) for vlan_id in range(1, vlans + 1)]
+
+    for switch in range(switches):
+        host = f"10.{switch // 65536}.{switch // 256 % 256}.{switch % 256}"
+        device = {
+            "host": host,
+            "port": 22,
+            "device_type": "cisco_ios",
+            "stp_template": "cisco_ios_show_spanning-tree.textfsm",
+            "cdp_template": "cisco_ios_show_cdp_neighbors.textfsm",
+            "version_template": "cisco_ios_show_version.textfsm",
+        }
+        result = {
+            "device": host,
+            "port": 22,
+            "device_type": "cisco_ios",
+            "prompt": f"SW{switch}",
+            "status": "success",
+            "stp_output_raw": build_stp_output(switch, vlan_trees),
+            "cdp_output_raw": build_cdp_output(switch, ports),
+            "version_output_raw": VERSION_OUTPUT.format(hostname=f"SW{switch}", uptime=seconds_to_uptime(3600 + switch * 997), serial=f"{switch:010d}"),
+            "version": "",
+            "serial": "",
+            "uptime": "",
+            "version_cached": False,
+            "id": switch,
+            "label": f"SW{switch}",
+            "title": f"SVI: {host}\nPlatform: cisco_ios",
+            "level": 9999,
+        }
+        yield device, result
@@ -1,7 +1,15 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import root, graph
+from routers import root, graph, history, metrics
+from graph.device_health import get_device_health
+from graph.logger import setup_logging, stop_logging
+from graph.parse_pool import close_parse_pool
+from graph.scheduler import get_poller
+from graph.session_pool import get_session_pool
+from graph.templates import get_template_registry
 from config import description, title
 from dotenv import load_dotenv
 import os
@@ -9,10 +17,31 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Log records are written by a background thread (STP_LOG_LEVEL, STP_LOG_FORMAT)
+    setup_logging()
+    # Read and compile the TextFSM templates once, before the first sweep
+    get_template_registry().preload()
+    # Collect the topology in the background every STP_POLL_INTERVAL seconds
+    get_poller().start()
+    yield
+    await get_poller().stop()
+    # Close the SSH sessions kept open between /stp-graph requests
+    get_session_pool().close_all()
+    # Stop the background probes of the devices that stopped answering
+    get_device_health().close()
+    # Stop the worker processes that parse the command outputs
+    close_parse_pool()
+    stop_logging()
+
+
 app = FastAPI(
     title=title,
     description=description,
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -25,6 +54,8 @@ app.add_middleware(
 
 app.include_router(router=root.router)
 app.include_router(router=graph.router)
+app.include_router(router=history.router)
+app.include_router(router=metrics.router)
 
 
 if __name__ == "__main__":
@@ -32,4 +63,8 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     reload = os.getenv("DEBUG", "False").lower() == "true"
 
-    uvicorn.run("main:app", host=host, port=port, reload=reload, workers=4)
+    # A single worker: the background poller, the SSH session pool and the device health state
+    # must exist once, otherwise each worker sweeps the network on its own and opens its own
+    # sessions to every switch (a Cisco IOS switch only has 5 VTY lines). Parsing still uses
+    # every core through the parse pool (STP_PARSE_WORKERS)
+    uvicorn.run("main:app", host=host, port=port, reload=reload, workers=1)
@@ -1,18 +1,47 @@
-import time
-from fastapi import APIRouter, HTTPException, status
+import asyncio
+import json
+from typing import Any, Dict, Optional
 
-from graph import code
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from graph.diff import diff_topologies
+from graph.scheduler import TopologyPoller, TopologySnapshot, get_poller
+from graph.snapshot_store import get_snapshot_store
 
 router = APIRouter(tags=["Graph"])
 
 
+def get_graph_response(snapshot: TopologySnapshot, poller: TopologyPoller) -> Dict[str, Any]:
+    data = snapshot.data
+    return {
+        "nodes": data.get("nodes"),
+        "edges": data.get("edges"),
+        "edges_with_blocked_links": data.get("edges_with_blocked_links"),
+        "blocked_interfaces": data.get("blocked_interfaces"),
+        "results": data.get("results"),
+        "elapsed_time": snapshot.elapsed_time,
+        **poller.describe(),
+    }
+
+
+def format_event(event: str, data: Dict[str, Any], output_format: str) -> str:
+    payload = jsonable_encoder(data)
+    if output_format == "sse":
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({"event": event, "data": payload}) + "\n"
+
+
 @router.get("/stp-graph")
-async def graph_endpoint():
-    start_total: float = time.time()
-    data = code.main()
-    end_total: float = time.time() - start_total
-    end_total, unit = code.print_execution_time(end_total)
-    elapsed_time = {"value": end_total, "unit": unit}
+async def graph_endpoint(refresh: bool = False, delta: bool = False, vlan: Optional[str] = None):
+    # Served from the last snapshot collected in the background. refresh=true forces a new
+    # sweep (shared with any other sweep already in progress). delta=true only returns what
+    # changed between the last two sweeps. vlan=N returns the spanning tree of VLAN N and
+    # vlan=all the spanning trees of every VLAN
+    poller = get_poller()
+    snapshot = await poller.get(refresh=refresh)
+    data = snapshot.data
 
     if data.get("error"):
         raise HTTPException(
@@ -20,11 +49,114 @@ async def graph_endpoint():
             detail=data.get("error_description"),
         )
 
+    if vlan == "all":
+        return {
+            "vlans": data.get("vlans"),
+            "results": data.get("results"),
+            "elapsed_time": snapshot.elapsed_time,
+            **poller.describe(),
+        }
+
+    if vlan is not None:
+        vlan_data = (data.get("vlans") or {}).get(vlan.lstrip("0") or "0")
+        if vlan_data is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"VLAN {vlan} has not been found",
+            )
+        if vlan_data.get("error"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=vlan_data.get("error_description"),
+            )
+
+        return {
+            **vlan_data,
+            "results": data.get("results"),
+            "elapsed_time": snapshot.elapsed_time,
+            **poller.describe(),
+        }
+
+    if delta:
+        return {
+            "delta": data.get("delta"),
+            "elapsed_time": snapshot.elapsed_time,
+            **poller.describe(),
+        }
+
+    return get_graph_response(snapshot, poller)
+
+
+@router.get("/stp-graph/stats")
+async def graph_stats_endpoint():
+    # calls: sweeps requested, executions: sweeps actually run, coalesced: requests that joined a running sweep
+    poller = get_poller()
     return {
-        "nodes": data.get("nodes"),
-        "edges": data.get("edges"),
-        "edges_with_blocked_links": data.get("edges_with_blocked_links"),
-        "blocked_interfaces": data.get("blocked_interfaces"),
-        "results": data.get("results"),
-        "elapsed_time": elapsed_time,
+        "singleflight": poller.singleflight.stats(),
+        **poller.describe(),
     }
+
+
+async def load_snapshot(snapshot_id: int) -> Dict[str, Any]:
+    # Reading the snapshot store is blocking file I/O
+    saved = await asyncio.to_thread(get_snapshot_store().load, snapshot_id)
+    if saved is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Snapshot {snapshot_id} has not been found",
+        )
+    return saved
+
+
+@router.get("/stp-graph/diff")
+async def graph_diff_endpoint(snapshot_id: int, to_snapshot_id: Optional[int] = None, refresh: bool = False):
+    # What changed from a saved snapshot to the live graph (or to another saved snapshot when
+    # to_snapshot_id is given): root bridge, nodes, links added/removed/blocked/unblocked and
+    # ports that became (or stopped being) Alternate, for the whole topology and each VLAN
+    old = await load_snapshot(snapshot_id)
+
+    if to_snapshot_id is not None:
+        new = await load_snapshot(to_snapshot_id)
+        to = {"snapshot_id": to_snapshot_id, "timestamp": new.get("timestamp")}
+    else:
+        poller = get_poller()
+        snapshot = await poller.get(refresh=refresh)
+        new = snapshot.data
+        if new.get("error"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=new.get("error_description"),
+            )
+        to = {"snapshot_id": None, **poller.describe()}
+
+    return {
+        "from": {"snapshot_id": snapshot_id, "timestamp": old.get("timestamp")},
+        "to": to,
+        "diff": diff_topologies(old, new),
+    }
+
+
+@router.get("/stp-graph/stream")
+async def graph_stream_endpoint(output_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$")):
+    # Runs (or joins) a sweep and emits a "device" event for each device as soon as it has been
+    # collected, followed by a "graph" event with the same content as /stp-graph (or an "error" event).
+    # format=ndjson emits one JSON object per line, format=sse emits server-sent events
+    poller = get_poller()
+
+    async def events():
+        try:
+            async for event in poller.stream():
+                if event["event"] == "device":
+                    yield format_event("device", event["data"], output_format)
+                    continue
+
+                snapshot = event["snapshot"]
+                if snapshot.data.get("error"):
+                    yield format_event("error", {"error_description": snapshot.data.get("error_description")}, output_format)
+                else:
+                    yield format_event("graph", get_graph_response(snapshot, poller), output_format)
+        except Exception as e:
+            yield format_event("error", {"error_description": str(e)}, output_format)
+
+    media_type = "text/event-stream" if output_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Query
+
+from graph.history_db import get_history_db
+
+router = APIRouter(prefix="/history", tags=["History"])
+
+# Answered with indexed queries on the history database (graph/history_db.py). The endpoints are
+# not async because sqlite3 is blocking: FastAPI runs them in its thread pool
+
+
+@router.get("/snapshots")
+def snapshots_endpoint(hours: float = Query(24, gt=0)):
+    # Saved topologies of the last hours
+    return {"snapshots": get_history_db().get_snapshots(hours)}
+
+
+@router.get("/root-bridge")
+def root_bridge_endpoint(hours: float = Query(24, gt=0)):
+    # Root bridge over the last hours, one period per root bridge change
+    return {"root_bridge": get_history_db().get_root_bridge_history(hours)}
+
+
+@router.get("/interface")
+def interface_endpoint(device: str, interface: str, hours: float = Query(24, gt=0)):
+    # When an interface became Alternate (blocked) and when it stopped being it,
+    # e.g. /history/interface?device=SW3&interface=G 1/0
+    return {
+        "device": device,
+        "interface": interface,
+        "history": get_history_db().get_interface_history(device, interface, hours),
+    }
+
+
+@router.get("/device")
+def device_endpoint(device: str, hours: float = Query(24, gt=0)):
+    # Level, priority and MAC address of a device over the last hours
+    return {"device": device, "history": get_history_db().get_device_history(device, hours)}